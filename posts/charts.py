@@ -0,0 +1,167 @@
+"""Графики статистики в SVG, отрисованные на сервере.
+
+Готовый SVG кэшируется по хэшу набора данных: если после изменения
+счетчиков данные графика не поменялись, повторной отрисовки нет.
+Отдельный ключ по версии счетчиков (stats.etag) позволяет отдать
+график вовсе без запросов к базе.
+"""
+import hashlib
+import json
+import math
+
+from django.core.cache import cache
+from django.utils.html import escape
+
+from . import stats
+
+VERSION_KEY = 'chart:version:{}'
+SVG_KEY = 'chart:svg:{}'
+CACHE_TIMEOUT = 24 * 60 * 60
+# Адрес графика меняется вместе с данными, так что ответ неизменен.
+MAX_AGE = 365 * 24 * 60 * 60
+# Ответ на адрес с устаревшей версией.
+STALE_MAX_AGE = 60
+
+WIDTH = 640
+HEIGHT = 360
+PADDING = 40
+GRID_STEPS = 5
+LABEL_LENGTH = 14
+FILLS = (
+    'rgba(255, 99, 132, 0.2)', 'rgba(54, 162, 235, 0.2)',
+    'rgba(255, 206, 86, 0.2)', 'rgba(75, 192, 192, 0.2)',
+    'rgba(153, 102, 255, 0.2)', 'rgba(255, 159, 64, 0.2)',
+)
+STROKES = (
+    'rgb(255, 99, 132)', 'rgb(54, 162, 235)', 'rgb(255, 206, 86)',
+    'rgb(75, 192, 192)', 'rgb(153, 102, 255)', 'rgb(255, 159, 64)',
+)
+
+
+def _text(x, y, text, anchor='middle', size=12, limit=LABEL_LENGTH):
+    if len(text) > limit:
+        text = text[:limit - 1] + '…'
+    return (
+        f'<text x="{x:.1f}" y="{y:.1f}" font-size="{size}" '
+        f'text-anchor="{anchor}">{escape(text)}</text>'
+    )
+
+
+def _svg(title, body):
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} '
+        f'{HEIGHT}" font-family="sans-serif" role="img">'
+        f'<title>{escape(title)}</title>'
+        f'{_text(WIDTH / 2, 20, title, size=14, limit=80)}'
+        f'{"".join(body)}</svg>'
+    )
+
+
+def _scale(data):
+    """Верхняя граница оси: «круглое» число не меньше максимума."""
+    top = max(data + [1])
+    step = 10 ** math.floor(math.log10(top))
+    for factor in (1, 2, 5, 10):
+        if top <= step * factor:
+            return step * factor
+    return top
+
+
+def bar(title, labels, data):
+    """Столбчатая диаграмма."""
+    top = _scale(data)
+    left, bottom = PADDING * 1.5, HEIGHT - PADDING
+    height = bottom - PADDING
+    body = []
+    for step in range(GRID_STEPS + 1):
+        value = top * step / GRID_STEPS
+        y = bottom - height * step / GRID_STEPS
+        body.append(
+            f'<line x1="{left:.1f}" y1="{y:.1f}" x2="{WIDTH - PADDING}" '
+            f'y2="{y:.1f}" stroke="#ddd"/>')
+        body.append(_text(left - 6, y + 4, f'{value:g}', 'end', 11))
+    slot = (WIDTH - PADDING - left) / max(len(data), 1)
+    for index, (label, value) in enumerate(zip(labels, data)):
+        x = left + slot * (index + 0.15)
+        bar_height = height * value / top
+        body.append(
+            f'<rect x="{x:.1f}" y="{bottom - bar_height:.1f}" '
+            f'width="{slot * 0.7:.1f}" height="{bar_height:.1f}" '
+            f'fill="{FILLS[index % len(FILLS)]}" '
+            f'stroke="{STROKES[index % len(STROKES)]}"/>')
+        body.append(_text(x + slot * 0.35, bottom - bar_height - 4,
+                          str(value), size=11))
+        body.append(_text(x + slot * 0.35, bottom + 16, label))
+    return _svg(title, body)
+
+
+def _point(angle, radius):
+    return (WIDTH / 2 + radius * math.sin(angle),
+            HEIGHT / 2 + 10 - radius * math.cos(angle))
+
+
+def _polygon(points, fill, stroke):
+    coords = ' '.join(f'{x:.1f},{y:.1f}' for x, y in points)
+    return (f'<polygon points="{coords}" fill="{fill}" '
+            f'stroke="{stroke}"/>')
+
+
+def radar(title, labels, data):
+    """Лепестковая диаграмма; меньше трех осей рисуется столбцами."""
+    if len(data) < 3:
+        return bar(title, labels, data)
+    top = _scale(data)
+    radius = HEIGHT / 2 - PADDING - 10
+    angles = [2 * math.pi * index / len(data) for index in range(len(data))]
+    body = []
+    for step in range(1, GRID_STEPS + 1):
+        body.append(_polygon(
+            [_point(angle, radius * step / GRID_STEPS) for angle in angles],
+            'none', '#ddd'))
+    for angle, label in zip(angles, labels):
+        x, y = _point(angle, radius)
+        body.append(
+            f'<line x1="{WIDTH / 2:.1f}" y1="{HEIGHT / 2 + 10:.1f}" '
+            f'x2="{x:.1f}" y2="{y:.1f}" stroke="#ddd"/>')
+        x, y = _point(angle, radius + 16)
+        anchor = 'middle' if abs(math.sin(angle)) < 0.1 else (
+            'start' if math.sin(angle) > 0 else 'end')
+        body.append(_text(x, y + 4, label, anchor))
+    body.append(_polygon(
+        [_point(angle, radius * value / top)
+         for angle, value in zip(angles, data)],
+        FILLS[0], STROKES[0]))
+    return _svg(title, body)
+
+
+CHARTS = {'bar': bar, 'radar': radar}
+
+
+def render(chart, dataset):
+    """SVG по набору данных stats.dataset."""
+    if not dataset['data']:
+        return _svg(dataset['label'], [
+            _text(WIDTH / 2, HEIGHT / 2, 'Нет данных')])
+    return CHARTS[chart](
+        dataset['label'], dataset['labels'], dataset['data'])
+
+
+def chart_svg(kind, version, date_from=None, date_to=None):
+    """SVG графика kind для версии счетчиков version.
+
+    При известной версии база не читается. Иначе набор данных
+    собирается заново, а SVG берется из кэша по его хэшу.
+    """
+    key = VERSION_KEY.format(version)
+    svg = cache.get(key)
+    if svg is not None:
+        return svg
+    dataset = stats.dataset(kind, date_from, date_to)
+    chart = stats.STATS[kind].chart
+    digest = hashlib.sha1(json.dumps(
+        [chart, dataset], ensure_ascii=False).encode()).hexdigest()
+    svg = cache.get_or_set(
+        SVG_KEY.format(digest), lambda: render(chart, dataset),
+        CACHE_TIMEOUT)
+    cache.set(key, svg, CACHE_TIMEOUT)
+    return svg
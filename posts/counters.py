@@ -0,0 +1,160 @@
+import time
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import (AuthorStat, Comment, DataVersion, Follow, Group, Post,
+                     User)
+
+STATS_VERSION_KEY = 'stats:version'
+GROUPS_VERSION_KEY = 'groups:version'
+# Сколько секунд процесс верит своей копии версии: у каждого процесса
+# Gunicorn свой кэш, общая версия лежит в базе.
+VERSION_TIMEOUT = 2
+
+
+def version(key):
+    """Версия данных под ключом key: меняется при каждом их изменении.
+
+    Все процессы читают ее из таблицы DataVersion, поэтому выдают
+    одинаковые ETag и адреса графиков.
+    """
+    value = cache.get(key)
+    if value is None:
+        value = DataVersion.objects.filter(key=key).values_list(
+            'value', flat=True).first() or 0
+        cache.set(key, value, VERSION_TIMEOUT)
+    return value
+
+
+def touch(key):
+    """Сдвигает версию данных под ключом key.
+
+    Первая версия берется от времени, чтобы после очистки таблицы
+    версия не повторила уже выданную.
+    """
+    rows = DataVersion.objects.filter(key=key)
+    if not rows.update(value=F('value') + 1):
+        try:
+            with transaction.atomic():
+                DataVersion.objects.create(
+                    key=key, value=int(time.time() * 1000))
+        except IntegrityError:
+            # Строку успели создать параллельно.
+            rows.update(value=F('value') + 1)
+    cache.delete(key)
+
+
+def stats_version():
+    """Версия счетчиков статистики."""
+    return version(STATS_VERSION_KEY)
+
+
+def touch_stats():
+    touch(STATS_VERSION_KEY)
+
+
+def _shifted(field, delta):
+    # Уменьшение не опускает счетчик ниже нуля: разошедшийся счетчик
+    # (bulk_create мимо сигналов) чинит recount, а удаление не падает
+    # на ограничении PositiveIntegerField.
+    if delta < 0:
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def bump(queryset, **deltas):
+    """Атомарно сдвигает счетчики выражением F() без чтения строк."""
+    updated = queryset.update(**{
+        field: _shifted(field, delta) for field, delta in deltas.items()
+    })
+    if updated:
+        touch_stats()
+    return updated
+
+
+def bump_or_create(model, lookup, **deltas):
+    """Сдвигает счетчики строки model по lookup, создавая ее при первом
+    обращении. Уменьшение строку не создает: при каскадном удалении
+    ее уже нет и создавать ее незачем."""
+    rows = model.objects.filter(**lookup)
+    if bump(rows, **deltas) or min(deltas.values()) < 0:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup)
+    except IntegrityError:
+        # Строку успели создать параллельно.
+        pass
+    bump(rows, **deltas)
+
+
+def bump_author(user_id, **deltas):
+    """Сдвигает счетчики AuthorStat пользователя."""
+    bump_or_create(AuthorStat, {'user_id': user_id}, **deltas)
+
+
+def bump_group(group_id, **deltas):
+    """Сдвигает счетчики группы; каталог групп устаревает."""
+    if bump(Group.objects.filter(pk=group_id), **deltas):
+        touch(GROUPS_VERSION_KEY)
+
+
+def _aggregate(model, field, aggregate):
+    """Подзапрос агрегата по внешнему ключу field для UPDATE."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(value=aggregate).values('value'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def _count(model, field):
+    return _aggregate(model, field, Count('pk'))
+
+
+def add_author_views(counts):
+    """Переносит сброшенные просмотры {post_id: n} в суммы авторов."""
+    by_author = {}
+    for post_id, author_id in Post.objects.filter(
+            pk__in=list(counts)).values_list('pk', 'author_id'):
+        by_author[author_id] = by_author.get(author_id, 0) + counts[post_id]
+    for author_id, views in by_author.items():
+        bump_author(author_id, views_sum=views)
+
+
+def _ensure_author_stats():
+    AuthorStat.objects.bulk_create(
+        [AuthorStat(user_id=pk) for pk in User.objects.filter(
+            stat__isnull=True).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+
+
+def recount_follows():
+    """Пересчитывает счетчики подписок, создавая недостающие строки."""
+    with transaction.atomic():
+        _ensure_author_stats()
+        AuthorStat.objects.update(
+            followers_count=_count(Follow, 'author'),
+            following_count=_count(Follow, 'user'),
+        )
+    touch_stats()
+
+
+def recount():
+    """Пересчитывает все поддерживаемые счетчики массовыми UPDATE."""
+    with transaction.atomic():
+        Post.objects.update(comment_count=_count(Comment, 'post'))
+        Group.objects.update(post_count=_count(Post, 'group'))
+        _ensure_author_stats()
+        AuthorStat.objects.update(
+            followers_count=_count(Follow, 'author'),
+            following_count=_count(Follow, 'user'),
+            posts_count=_count(Post, 'author'),
+            views_sum=_aggregate(Post, 'author', Sum('views')),
+        )
+    touch_stats()
+    touch(GROUPS_VERSION_KEY)
@@ -0,0 +1,139 @@
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
+
+from .counters import bump_or_create, touch_stats
+from .models import (Comment, DailyAuthorStat, DailyGroupStat, Post,
+                     PostViewBucket)
+
+GROUP_FIELDS = ('posts', 'comments', 'views')
+
+
+def record(author_id, group_id=None, day=None, **deltas):
+    """Учитывает события дня для автора и, если есть, для группы."""
+    day = day or date.today()
+    bump_or_create(
+        DailyAuthorStat, {'author_id': author_id, 'date': day}, **deltas)
+    group_deltas = {
+        field: delta for field, delta in deltas.items()
+        if field in GROUP_FIELDS
+    }
+    if group_id and group_deltas:
+        bump_or_create(
+            DailyGroupStat, {'group_id': group_id, 'date': day},
+            **group_deltas)
+
+
+def add_views(counts, day=None):
+    """Раскладывает сброшенные просмотры {post_id: n} по дням авторов
+    и групп."""
+    authors = Counter()
+    groups = Counter()
+    for post_id, author_id, group_id in Post.objects.filter(
+            pk__in=list(counts)).values_list('pk', 'author_id', 'group_id'):
+        authors[author_id] += counts[post_id]
+        if group_id:
+            groups[group_id] += counts[post_id]
+    day = day or date.today()
+    for author_id, views in authors.items():
+        bump_or_create(
+            DailyAuthorStat, {'author_id': author_id, 'date': day},
+            views=views)
+    for group_id, views in groups.items():
+        bump_or_create(
+            DailyGroupStat, {'group_id': group_id, 'date': day},
+            views=views)
+
+
+def top(model, label, field, date_from=None, date_to=None, limit=5):
+    """Первые limit строк по сумме field за диапазон дат.
+
+    Возвращает пары (подпись, сумма); подпись берется по пути label,
+    например 'author__username'.
+    """
+    rows = model.objects.all()
+    if date_from:
+        rows = rows.filter(date__gte=date_from)
+    if date_to:
+        rows = rows.filter(date__lte=date_to)
+    return list(rows.values(label).annotate(total=Sum(field)).filter(
+        total__gt=0).order_by('-total', label).values_list(
+            label, 'total')[:limit])
+
+
+def _merge(model, key, totals):
+    """Прибавляет {(id, date): {field: n}} к строкам model."""
+    for (object_id, day), deltas in totals.items():
+        bump_or_create(model, {key: object_id, 'date': day}, **deltas)
+
+
+def _chunks(queryset, chunk_size):
+    """Границы id, по которым queryset читается кусками."""
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    last = 0
+    while True:
+        chunk = list(ids.filter(pk__gt=last)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk[0], chunk[-1]
+        last = chunk[-1]
+
+
+def _backfill_events(queryset, author, group, field, aggregate, day_field,
+                     chunk_size):
+    """Сводит queryset по (автор, день) и (группа, день) кусками."""
+    for low, high in _chunks(queryset, chunk_size):
+        rows = queryset.filter(pk__gte=low, pk__lte=high).annotate(
+            day=TruncDate(day_field)).order_by().values(
+                'day', author, group).annotate(count=aggregate)
+        authors = Counter()
+        groups = Counter()
+        for row in rows:
+            authors[(row[author], row['day'])] += row['count']
+            if row[group]:
+                groups[(row[group], row['day'])] += row['count']
+        with transaction.atomic():
+            _merge(DailyAuthorStat, 'author_id', {
+                key: {field: count} for key, count in authors.items()})
+            _merge(DailyGroupStat, 'group_id', {
+                key: {field: count} for key, count in groups.items()})
+
+
+def _views_since():
+    """Первый день, за который часовые корзины сохранились целиком:
+    корзины старше окна рейтинга удаляются. None, если корзин нет."""
+    oldest = PostViewBucket.objects.aggregate(oldest=Min('hour'))['oldest']
+    if oldest is None:
+        return None
+    if oldest.time() != time.min:
+        return oldest.date() + timedelta(days=1)
+    return oldest.date()
+
+
+def backfill(chunk_size=1000):
+    """Пересобирает дневные сводки постов, комментариев и просмотров
+    кусками по chunk_size строк. Подписки не трогаются: в posts_follow
+    нет даты подписки и восстановить их не из чего. Просмотры за дни,
+    корзин которых уже нет, остаются такими, какими были в сводках."""
+    since = _views_since()
+    buckets = PostViewBucket.objects.none()
+    for model in (DailyAuthorStat, DailyGroupStat):
+        model.objects.update(posts=0, comments=0)
+    if since is not None:
+        buckets = PostViewBucket.objects.filter(
+            hour__gte=datetime.combine(since, time.min))
+        for model in (DailyAuthorStat, DailyGroupStat):
+            model.objects.filter(date__gte=since).update(views=0)
+    _backfill_events(
+        Post.objects.all(), 'author_id', 'group_id',
+        'posts', Count('pk'), 'pub_date', chunk_size)
+    _backfill_events(
+        Comment.objects.all(), 'post__author_id', 'post__group_id',
+        'comments', Count('pk'), 'created', chunk_size)
+    _backfill_events(
+        buckets, 'post__author_id', 'post__group_id',
+        'views', Sum('views'), 'hour', chunk_size)
+    touch_stats()
@@ -19,3 +19,16 @@ class GroupForm(forms.ModelForm):
     class Meta:
         model = Group
         fields = ['title', 'slug', 'description']
+
+
+class StatRangeForm(forms.Form):
+    date_from = forms.DateField(
+        label='С',
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date'}),
+    )
+    date_to = forms.DateField(
+        label='По',
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date'}),
+    )
@@ -0,0 +1,35 @@
+"""Сведения о загруженной картинке для карточки поста.
+
+Размеры, формат и крошечная заглушка (LQIP) считаются один раз при
+загрузке и хранятся в полях поста, поэтому отрисовка карточки не
+открывает файл. JPEG через Image.draft декодируется сразу в масштабе
+1/8, без распаковки полного кадра.
+"""
+import base64
+from collections import namedtuple
+from io import BytesIO
+
+from PIL import Image
+
+ImageMeta = namedtuple(
+    'ImageMeta', ['width', 'height', 'format', 'placeholder'])
+
+# Размер заглушки: браузер растягивает ее до карточки с размытием.
+PLACEHOLDER_SIZE = (16, 16)
+
+
+def describe(file):
+    """ImageMeta картинки из открытого файла; заглушка — data URI PNG."""
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        image_format = image.format or ''
+        image.draft('RGB', PLACEHOLDER_SIZE)
+        small = image.convert('RGB')
+    file.seek(0)
+    small.thumbnail(PLACEHOLDER_SIZE)
+    buffer = BytesIO()
+    small.save(buffer, 'PNG', optimize=True)
+    placeholder = base64.b64encode(buffer.getvalue()).decode()
+    return ImageMeta(
+        width, height, image_format, f'data:image/png;base64,{placeholder}')
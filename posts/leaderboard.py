@@ -0,0 +1,36 @@
+from django.db.models import Count
+
+from .models import AuthorStat, Follow, Group
+
+
+def top_authors(limit, by='followers_count'):
+    """Первые limit авторов по поддерживаемому счетчику by: чтение
+    по индексу (by, user) вместе с именем, без агрегации."""
+    return AuthorStat.objects.filter(**{f'{by}__gt': 0}).order_by(
+        f'-{by}', 'user_id').select_related('user')[:limit]
+
+
+def top_groups(limit):
+    """Первые limit групп по числу постов."""
+    return Group.objects.filter(post_count__gt=0).order_by(
+        '-post_count', 'id')[:limit]
+
+
+def drift():
+    """Расхождения таблицы лидеров с posts_follow.
+
+    Возвращает список (user_id, сохранено, на самом деле);
+    отсутствующая строка AuthorStat дает None в «сохранено».
+    """
+    actual = dict(Follow.objects.values('author').annotate(
+        count=Count('id')).values_list('author', 'count'))
+    stored = dict(AuthorStat.objects.filter(
+        followers_count__gt=0).values_list('user_id', 'followers_count'))
+    stored.update(AuthorStat.objects.filter(
+        user_id__in=set(actual) - set(stored)).values_list(
+            'user_id', 'followers_count'))
+    return sorted(
+        (user_id, stored.get(user_id), actual.get(user_id, 0))
+        for user_id in set(actual) | set(stored)
+        if stored.get(user_id) != actual.get(user_id, 0)
+    )
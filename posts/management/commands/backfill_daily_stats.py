@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import daily
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает дневные сводки статистики по постам, '
+            'комментариям и просмотрам')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк исходной таблицы читать за раз')
+
+    def handle(self, *args, **options):
+        daily.backfill(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS('Дневные сводки пересобраны'))
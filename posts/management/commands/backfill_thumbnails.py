@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создает недостающие варианты картинок постов из media/posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS,
+            help='Сколько процессов создают миниатюры; 0 — без пула')
+
+    def handle(self, *args, **options):
+        directory = Post._meta.get_field('image').upload_to.rstrip('/')
+        if not default_storage.exists(directory):
+            self.stdout.write('Картинок нет')
+            return
+        _, files = default_storage.listdir(directory)
+        names = [f'{directory}/{name}' for name in sorted(files)]
+        done, failed = thumbnails.backfill(names, options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок обработано: {done}, с ошибками: {failed}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = ('Раскладывает по лентам посты авторов, вышедших из режима '
+            'подмешивания')
+
+    def handle(self, *args, **options):
+        total = timeline.catch_up()
+        self.stdout.write(self.style.SUCCESS(
+            f'Авторов возвращено к раскладке: {total}'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import storage
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Переименовывает картинки постов по хешу содержимого, '
+            'удаляет одинаковые копии и заводит счетчики ссылок')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать дубликаты, ничего не меняя')
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        directory = field.upload_to.rstrip('/')
+        if not field.storage.exists(directory):
+            self.stdout.write('Картинок нет')
+            return
+        files, removed = storage.dedup(
+            field.storage, directory, Post, field.name, options['dry_run'])
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов: {files}. {verb} копий: {removed}. '
+            'Миниатюры для новых имен создаст backfill_thumbnails.'))
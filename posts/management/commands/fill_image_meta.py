@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from posts import images
+from posts.models import Post
+
+FIELDS = ['image_width', 'image_height', 'image_format', 'image_placeholder']
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, формат и заглушку картинок постов, '
+            'загруженных до появления этих полей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help='Сколько постов сохранять за раз')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None).filter(
+            image_width=None).only('image')
+        batch = []
+        filled = missing = 0
+        for post in posts.iterator():
+            try:
+                with post.image.open() as file:
+                    meta = images.describe(file)
+            except OSError:
+                # Файла нет или он не читается как картинка.
+                missing += 1
+                continue
+            (post.image_width, post.image_height, post.image_format,
+             post.image_placeholder) = meta
+            batch.append(post)
+            if len(batch) >= options['chunk_size']:
+                Post.objects.bulk_update(batch, FIELDS)
+                filled += len(batch)
+                batch = []
+        Post.objects.bulk_update(batch, FIELDS)
+        filled += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Заполнено постов: {filled}, картинок не найдено: {missing}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import pageviews, trending
+
+
+class Command(BaseCommand):
+    help = 'Сбрасывает накопленные в кэше просмотры постов в базу'
+
+    def handle(self, *args, **options):
+        if not pageviews.shared_buffer():
+            self.stdout.write(self.style.WARNING(
+                'Кэш принадлежит одному процессу: команда видит только '
+                'свой пустой буфер, просмотры воркеров сбрасываются '
+                'в их запросах. Для сброса командой нужен общий кэш '
+                '(memcached, redis).'))
+        taken = pageviews.flush()
+        trending.recompute_if_due()
+        if taken is None:
+            self.stdout.write(self.style.WARNING('Сброс уже выполняется'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано просмотров: {sum(taken.values())}, '
+            f'постов: {len(taken)}'))
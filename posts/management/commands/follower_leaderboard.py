@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts import leaderboard
+from posts.counters import recount_follows
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает таблицу лидеров по подписчикам '
+            'или сверяет ее с posts_follow')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить с posts_follow, ничего не меняя')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            recount_follows()
+            self.stdout.write(
+                self.style.SUCCESS('Таблица лидеров пересобрана'))
+            return
+        mismatches = leaderboard.drift()
+        for user_id, stored, actual in mismatches:
+            self.stdout.write(
+                f'user {user_id}: сохранено {stored}, подписчиков {actual}')
+        if mismatches:
+            self.stdout.write(self.style.ERROR(
+                f'Расхождений: {len(mismatches)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
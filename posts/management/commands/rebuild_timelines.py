@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок с нуля'
+
+    def handle(self, *args, **options):
+        total = timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Лент пересобрано, записей: {total}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import trigrams
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает индекс триграмм имен пользователей и групп'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк читать и вставлять за раз')
+
+    def handle(self, *args, **options):
+        total = trigrams.rebuild(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс триграмм пересобран, записей: {total}'))
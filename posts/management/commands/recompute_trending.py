@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинг постов «в тренде»'
+
+    def handle(self, *args, **options):
+        total = trending.recompute()
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов в рейтинге: {total}'))
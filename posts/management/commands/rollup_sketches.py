@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from posts import sketches
+
+
+class Command(BaseCommand):
+    help = 'Сворачивает часовые скетчи уникальных просмотров в дневные'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-hours', type=int, default=24,
+            help='Сколько последних часов оставить в часовых скетчах')
+
+    def handle(self, *args, **options):
+        before = sketches.hour_start() - timedelta(
+            hours=options['keep_hours'])
+        total = sketches.rollup(before)
+        self.stdout.write(self.style.SUCCESS(
+            f'Свернуто часовых скетчей: {total}'))
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.9 on 2026-10-18 01:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0029_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSketch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Час'), ('day', 'День'), ('total', 'Всего')], max_length=5, verbose_name='Период')),
+                ('start', models.DateTimeField(verbose_name='Начало периода')),
+                ('registers', models.BinaryField(verbose_name='Регистры')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='unique_views',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Уникальные просмотры'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['unique_views', 'id'], name='post_unique_views_idx'),
+        ),
+        migrations.AddField(
+            model_name='postsketch',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sketches', to='posts.Post', verbose_name='Пост'),
+        ),
+        migrations.AddIndex(
+            model_name='postsketch',
+            index=models.Index(fields=['period', 'start'], name='sketch_period_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postsketch',
+            constraint=models.UniqueConstraint(fields=('post', 'period', 'start'), name='post sketch restraint'),
+        ),
+    ]
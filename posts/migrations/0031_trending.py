@@ -0,0 +1,42 @@
+# Generated by Django 2.2.9 on 2026-10-18 01:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0030_unique_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingPost',
+            fields=[
+                ('rank', models.PositiveIntegerField(primary_key=True, serialize=False, verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Рейтинг')),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='trending', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostViewBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='posts.Post', verbose_name='Пост')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='postviewbucket',
+            index=models.Index(fields=['hour'], name='view_bucket_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postviewbucket',
+            constraint=models.UniqueConstraint(fields=('post', 'hour'), name='post hour bucket restraint'),
+        ),
+    ]
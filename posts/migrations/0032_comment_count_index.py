@@ -0,0 +1,17 @@
+# Generated by Django 2.2.9 on 2026-10-18 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0031_trending'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['comment_count', 'id'], name='post_comment_count_idx'),
+        ),
+    ]
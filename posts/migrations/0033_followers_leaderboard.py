@@ -0,0 +1,17 @@
+# Generated by Django 2.2.9 on 2026-10-18 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0032_comment_count_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='authorstat',
+            index=models.Index(fields=['followers_count', 'user'], name='author_followers_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.9 on 2026-10-18 01:13
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_author_stats(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    AuthorStat = apps.get_model('posts', 'AuthorStat')
+
+    def aggregate(value):
+        return Coalesce(Subquery(
+            Post.objects.filter(author=OuterRef('pk')).order_by()
+            .values('author').annotate(value=value).values('value'),
+            output_field=IntegerField(),
+        ), 0)
+
+    AuthorStat.objects.update(
+        posts_count=aggregate(Count('pk')),
+        views_sum=aggregate(Sum('views')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0033_followers_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstat',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Записей'),
+        ),
+        migrations.AddField(
+            model_name='authorstat',
+            name='views_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Просмотров записей'),
+        ),
+        migrations.AddIndex(
+            model_name='authorstat',
+            index=models.Index(fields=['posts_count', 'user'], name='author_posts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='authorstat',
+            index=models.Index(fields=['views_sum', 'user'], name='author_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['post_count', 'id'], name='group_posts_idx'),
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.9 on 2026-10-18 01:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0034_stats_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyGroupStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Посты')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментарии')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='posts.Group', verbose_name='Группа')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyAuthorStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Посты')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментарии')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('follows', models.PositiveIntegerField(default=0, verbose_name='Подписки')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dailygroupstat',
+            index=models.Index(fields=['date', 'group'], name='daily_group_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailygroupstat',
+            constraint=models.UniqueConstraint(fields=('group', 'date'), name='group day restraint'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyauthorstat',
+            index=models.Index(fields=['date', 'author'], name='daily_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyauthorstat',
+            constraint=models.UniqueConstraint(fields=('author', 'date'), name='author day restraint'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import migrations
+
+# Полнотекстовый индекс FTS5 по тексту поста, имени автора и названию
+# группы. rowid строки индекса совпадает с id поста. Индекс есть только
+# на SQLite, на других базах поиск идет запасным путем (posts.search).
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text, username, group_title,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text, username, group_title)
+        SELECT new.id, new.text,
+            (SELECT username FROM {user} WHERE id = new.author_id),
+            (SELECT title FROM posts_group WHERE id = new.group_id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, author_id, group_id ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+        INSERT INTO posts_post_fts (rowid, text, username, group_title)
+        SELECT new.id, new.text,
+            (SELECT username FROM {user} WHERE id = new.author_id),
+            (SELECT title FROM posts_group WHERE id = new.group_id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_username
+    AFTER UPDATE OF username ON {user} BEGIN
+        UPDATE posts_post_fts SET username = new.username
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_group_title
+    AFTER UPDATE OF title ON posts_group BEGIN
+        UPDATE posts_post_fts SET group_title = new.title
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO posts_post_fts (rowid, text, username, group_title)
+    SELECT post.id, post.text, author.username, grp.title
+    FROM posts_post AS post
+    JOIN {user} AS author ON author.id = post.author_id
+    LEFT JOIN posts_group AS grp ON grp.id = post.group_id
+    """,
+]
+DROP = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_username',
+    'DROP TRIGGER IF EXISTS posts_post_fts_group_title',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+def _execute(statements, apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    for statement in statements:
+        schema_editor.execute(statement.format(user=User._meta.db_table))
+
+
+def create_index(apps, schema_editor):
+    _execute(CREATE, apps, schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    _execute(DROP, apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0035_daily_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.9 on 2026-10-18 01:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_trigrams(apps, schema_editor):
+    Trigram = apps.get_model('posts', 'Trigram')
+    Group = apps.get_model('posts', 'Group')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    sources = (('user', User, 'username'), ('group', Group, 'title'))
+    for kind, model, field in sources:
+        rows = []
+        for pk, text in model.objects.values_list('pk', field).iterator():
+            text = (text or '').lower()
+            rows.extend(
+                Trigram(kind=kind, gram=gram, object_id=pk)
+                for gram in {text[i:i + 3] for i in range(len(text) - 2)})
+        Trigram.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0036_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trigram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('user', 'Пользователь'), ('group', 'Группа')], max_length=5, verbose_name='Тип')),
+                ('gram', models.CharField(max_length=3, verbose_name='Триграмма')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id объекта')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trigram',
+            index=models.Index(fields=['kind', 'object_id'], name='trigram_object_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='trigram',
+            constraint=models.UniqueConstraint(fields=('kind', 'gram', 'object_id'), name='trigram posting restraint'),
+        ),
+        migrations.RunPython(fill_trigrams, migrations.RunPython.noop),
+    ]
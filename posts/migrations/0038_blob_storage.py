@@ -0,0 +1,32 @@
+# Generated by Django 2.2.9 on 2026-10-18 01:33
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0037_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Имя файла')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='Размер')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Ссылки')),
+            ],
+        ),
+        # Хранилище не меняет схему, а пересоздание таблицы постов
+        # в SQLite сломало бы триггеры полнотекстового индекса.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, help_text='Загрузите картинку', null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+            ),
+        ]),
+    ]
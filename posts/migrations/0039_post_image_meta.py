@@ -0,0 +1,43 @@
+# Generated by Django 2.2.9 on 2026-10-18 01:35
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# SQLite добавляет столбцы пересозданием posts_post, а это ломает
+# триггеры полнотекстового индекса: индекс снимается и строится заново.
+post_search = import_module('posts.migrations.0036_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0038_blob_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            post_search.drop_index, post_search.create_index),
+        migrations.AddField(
+            model_name='post',
+            name='image_format',
+            field=models.CharField(blank=True, editable=False, max_length=10, verbose_name='Формат картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Заглушка картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.RunPython(
+            post_search.create_index, post_search.drop_index),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def seed_unique_views(apps, schema_editor):
+    # Скетчей до 0030 нет: лучшая оценка читателей старого поста — его
+    # просмотры. Иначе «самые просматриваемые» шли бы просто по id.
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(unique_views=0).update(unique_views=F('views'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0039_post_image_meta'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_unique_views, migrations.RunPython.noop),
+    ]
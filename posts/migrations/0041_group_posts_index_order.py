@@ -0,0 +1,21 @@
+# Generated by Django 2.2.9 on 2026-10-18 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0040_seed_unique_views'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='group',
+            name='group_posts_idx',
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-post_count', 'id'], name='group_posts_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.9 on 2026-10-18 02:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def mark_pulled_authors(apps, schema_editor):
+    # Когда популярные авторы перешли к подмешиванию, неизвестно:
+    # считаем, что с регистрации, catch_up разложит все их посты.
+    AuthorStat = apps.get_model('posts', 'AuthorStat')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    AuthorStat.objects.filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).update(pull_since=Subquery(User.objects.filter(
+        pk=OuterRef('user_id')).values('date_joined')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0041_group_posts_index_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstat',
+            name='pull_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Подмешивается с'),
+        ),
+        migrations.RunPython(mark_pulled_authors, migrations.RunPython.noop),
+    ]
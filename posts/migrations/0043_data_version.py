@@ -0,0 +1,20 @@
+# Generated by Django 2.2.9 on 2026-10-18 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0042_author_pull_since'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('key', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Ключ')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Версия')),
+            ],
+        ),
+    ]
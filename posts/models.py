@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.utils import timezone
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -9,11 +11,37 @@ class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Название группы')
     slug = models.SlugField(unique=True, verbose_name='Слаг')
     description = models.TextField(verbose_name='Описание')
+    post_count = models.PositiveIntegerField(
+        'Количество постов', default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-post_count', 'id'], name='group_posts_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    # Столбцы, которые отрисовывает карточка include/post_item.html.
+    FEED_FIELDS = (
+        'text', 'pub_date', 'image', 'image_width', 'image_placeholder',
+        'views', 'comment_count', 'unique_views', 'author__username',
+        'group__title', 'group__slug',
+    )
+
+    def feed(self):
+        """Посты для лент: автор и группа одним JOIN, без лишних столбцов.
+
+        Число комментариев берется из поддерживаемого comment_count,
+        поэтому страница ленты стоит одинаковое число запросов
+        при любом размере.
+        """
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст сообщения',
@@ -37,15 +65,51 @@ class Post(models.Model):
     )
     image = models.ImageField(
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True,
         verbose_name='Картинка',
         help_text='Загрузите картинку'
     )
+    # Заполняются при загрузке картинки (posts/images.py).
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False)
+    image_format = models.CharField(
+        'Формат картинки', max_length=10, blank=True, editable=False)
+    image_placeholder = models.TextField(
+        'Заглушка картинки', blank=True, editable=False)
     views = models.PositiveIntegerField('Просмотры', default=0)
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0, editable=False)
+    unique_views = models.PositiveIntegerField(
+        'Уникальные просмотры', default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        # Индексы под keyset-пагинацию лент по (pub_date, id).
+        indexes = [
+            models.Index(fields=['pub_date', 'id'], name='post_feed_idx'),
+            models.Index(
+                fields=['author', 'pub_date', 'id'],
+                name='post_author_feed_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date', 'id'],
+                name='post_group_feed_idx'
+            ),
+            models.Index(
+                fields=['unique_views', 'id'],
+                name='post_unique_views_idx'
+            ),
+            models.Index(
+                fields=['comment_count', 'id'],
+                name='post_comment_count_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -97,3 +161,257 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user}->{self.author}'
+
+
+class PostSketch(models.Model):
+    """Скетч HyperLogLog уникальных читателей поста за период."""
+    HOUR = 'hour'
+    DAY = 'day'
+    TOTAL = 'total'
+    PERIODS = [
+        (HOUR, 'Час'),
+        (DAY, 'День'),
+        (TOTAL, 'Всего'),
+    ]
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='sketches',
+        verbose_name='Пост',
+    )
+    period = models.CharField('Период', max_length=5, choices=PERIODS)
+    start = models.DateTimeField('Начало периода')
+    registers = models.BinaryField('Регистры')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['post', 'period', 'start'], name='post sketch restraint')]
+        indexes = [
+            models.Index(fields=['period', 'start'], name='sketch_period_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} {self.period} {self.start}'
+
+
+class PostViewBucket(models.Model):
+    """Просмотры поста за час."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='view_buckets',
+        verbose_name='Пост',
+    )
+    hour = models.DateTimeField('Час')
+    views = models.PositiveIntegerField('Просмотры', default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['post', 'hour'], name='post hour bucket restraint')]
+        indexes = [
+            models.Index(fields=['hour'], name='view_bucket_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} {self.hour}: {self.views}'
+
+
+class TrendingPost(models.Model):
+    """Место поста в пересчитываемом рейтинге «в тренде»."""
+    rank = models.PositiveIntegerField('Место', primary_key=True)
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='trending',
+        verbose_name='Пост',
+    )
+    score = models.FloatField('Рейтинг')
+
+    class Meta:
+        ordering = ['rank']
+
+    def __str__(self):
+        return f'{self.rank}: {self.post_id}'
+
+
+class AuthorStat(models.Model):
+    """Поддерживаемые счетчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stat',
+        verbose_name='Пользователь',
+    )
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    views_sum = models.PositiveIntegerField('Просмотров записей', default=0)
+    # С какого момента посты автора не раскладываются по лентам;
+    # пусто, когда лента подписчиков полная.
+    pull_since = models.DateTimeField(
+        'Подмешивается с', null=True, blank=True, editable=False)
+
+    class Meta:
+        # Таблицы лидеров и статистика читаются по этим индексам.
+        indexes = [
+            models.Index(
+                fields=['followers_count', 'user'],
+                name='author_followers_idx'
+            ),
+            models.Index(
+                fields=['posts_count', 'user'],
+                name='author_posts_idx'
+            ),
+            models.Index(
+                fields=['views_sum', 'user'],
+                name='author_views_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.followers_count}/{self.following_count}'
+
+
+class DailyAuthorStat(models.Model):
+    """Дневные события по автору: новые посты, комментарии к его
+    постам, просмотры его постов и новые подписчики."""
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+        verbose_name='Автор',
+    )
+    date = models.DateField('Дата')
+    posts = models.PositiveIntegerField('Посты', default=0)
+    comments = models.PositiveIntegerField('Комментарии', default=0)
+    views = models.PositiveIntegerField('Просмотры', default=0)
+    follows = models.PositiveIntegerField('Подписки', default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['author', 'date'], name='author day restraint')]
+        indexes = [
+            models.Index(fields=['date', 'author'], name='daily_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.author_id} {self.date}'
+
+
+class DailyGroupStat(models.Model):
+    """Дневные события по группе: новые посты, комментарии и просмотры."""
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+        verbose_name='Группа',
+    )
+    date = models.DateField('Дата')
+    posts = models.PositiveIntegerField('Посты', default=0)
+    comments = models.PositiveIntegerField('Комментарии', default=0)
+    views = models.PositiveIntegerField('Просмотры', default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['group', 'date'], name='group day restraint')]
+        indexes = [
+            models.Index(fields=['date', 'group'], name='daily_group_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.group_id} {self.date}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    # Копия Post.pub_date: лента читается одним проходом по индексу.
+    pub_date = models.DateTimeField('date published')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'post'], name='user and post timeline restraint')]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='timeline_feed_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}<-{self.post_id}'
+
+
+class Trigram(models.Model):
+    """Строка инвертированного индекса триграмм: триграмма gram
+    встречается в имени пользователя или названии группы object_id."""
+    USER = 'user'
+    GROUP = 'group'
+    KINDS = [
+        (USER, 'Пользователь'),
+        (GROUP, 'Группа'),
+    ]
+
+    kind = models.CharField('Тип', max_length=5, choices=KINDS)
+    gram = models.CharField('Триграмма', max_length=3)
+    object_id = models.PositiveIntegerField('id объекта')
+
+    class Meta:
+        # Уникальный индекс по (kind, gram, object_id) и есть списки
+        # объектов триграмм; второй индекс нужен для переиндексации.
+        constraints = [models.UniqueConstraint(
+            fields=['kind', 'gram', 'object_id'],
+            name='trigram posting restraint')]
+        indexes = [
+            models.Index(
+                fields=['kind', 'object_id'],
+                name='trigram_object_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.gram} {self.object_id}'
+
+
+class Blob(models.Model):
+    """Файл хранилища картинок и число постов, которые на него
+    ссылаются (см. posts/storage.py)."""
+    name = models.CharField('Имя файла', max_length=100, unique=True)
+    size = models.PositiveIntegerField('Размер', default=0)
+    refs = models.PositiveIntegerField('Ссылки', default=0)
+
+    def __str__(self):
+        return f'{self.name} x{self.refs}'
+
+
+class DataVersion(models.Model):
+    """Версия набора данных (см. posts/counters.py): общая для всех
+    процессов, в отличие от их локальных кэшей."""
+    key = models.CharField('Ключ', max_length=50, primary_key=True)
+    value = models.BigIntegerField('Версия', default=0)
+
+    def __str__(self):
+        return f'{self.key}: {self.value}'
@@ -0,0 +1,151 @@
+"""Отложенная запись просмотров постов.
+
+Просмотр не пишет в базу: он атомарно увеличивает в кэше счетчик поста
+и счетчик поста за текущий час. Когда часовой счетчик переходит из 0 в 1,
+пара (пост, час) регистрируется в очередном слоте журнала, чтобы сброс
+знал, какие счетчики трогать. Сброс забирает накопленное через decr
+(просмотры, пришедшие во время сброса, остаются в кэше) и пишет его
+пачками UPDATE ... SET views = views + n; в часовые корзины рейтинга
+просмотры попадают по часу, когда они случились, а не по часу сброса.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import F
+
+from . import daily, sketches, trending
+from .counters import add_author_views
+from .models import Post
+from .sketches import hour_start
+
+COUNT_KEY = 'pageviews:post:{}'
+HOUR_KEY = 'pageviews:post:{}:{}'
+HOUR_FORMAT = '%Y%m%d%H'
+SLOT_KEY = 'pageviews:slot:{}'
+SEQ_KEY = 'pageviews:seq'
+FLUSHED_KEY = 'pageviews:flushed'
+TOTAL_KEY = 'pageviews:total'
+TIMER_KEY = 'pageviews:timer'
+LOCK_KEY = 'pageviews:lock'
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Ключ вытеснили между add и incr.
+        cache.add(key, delta, None)
+        return delta
+
+
+def record_view(post, visitor, moment=None):
+    """Учитывает просмотр поста читателем visitor (пользователь или
+    сессия), при необходимости сбрасывает буфер."""
+    sketches.add_visitor(post.pk, visitor, moment)
+    hour = hour_start(moment).strftime(HOUR_FORMAT)
+    _incr(COUNT_KEY.format(post.pk))
+    if _incr(HOUR_KEY.format(post.pk, hour)) == 1:
+        cache.set(SLOT_KEY.format(_incr(SEQ_KEY)), (post.pk, hour), None)
+    total = _incr(TOTAL_KEY)
+    timer_expired = cache.add(TIMER_KEY, 1, settings.VIEWS_FLUSH_INTERVAL)
+    if total >= settings.VIEWS_FLUSH_THRESHOLD or timer_expired:
+        flush()
+
+
+def shared_buffer():
+    """Виден ли буфер другим процессам: у LocMemCache он свой
+    у каждого воркера и пропадает с его перезапуском."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def pending(post_id):
+    """Просмотры поста, еще не записанные в базу."""
+    return cache.get(COUNT_KEY.format(post_id)) or 0
+
+
+def _decr(key, delta):
+    try:
+        return cache.decr(key, delta)
+    except ValueError:
+        # Счетчик вытеснен из кэша, забираем то, что успели прочитать.
+        return 0
+
+
+def _take_pending():
+    """Забирает из кэша накопленные просмотры: {(post_id, час): n}."""
+    flushed = cache.get(FLUSHED_KEY, 0)
+    seq = cache.get(SEQ_KEY, 0)
+    slots = [SLOT_KEY.format(n) for n in range(flushed + 1, seq + 1)]
+    keys = {
+        pair: HOUR_KEY.format(*pair)
+        for pair in set(cache.get_many(slots).values())
+    }
+    counts = cache.get_many(list(keys.values()))
+    taken = {}
+    for pair, key in keys.items():
+        count = counts.get(key)
+        if not count:
+            continue
+        if _decr(key, count):
+            # Просмотры, пришедшие во время сброса, ждут следующего.
+            cache.set(SLOT_KEY.format(_incr(SEQ_KEY)), pair, None)
+        _decr(COUNT_KEY.format(pair[0]), count)
+        taken[pair] = count
+    cache.set(FLUSHED_KEY, seq, None)
+    cache.delete_many(slots)
+    cache.set(TOTAL_KEY, 0, None)
+    return taken
+
+
+def _chunks(counts, size):
+    """Куски словаря {post_id: n} не больше size постов."""
+    post_ids = list(counts)
+    for start in range(0, len(post_ids), size):
+        yield {
+            post_id: counts[post_id]
+            for post_id in post_ids[start:start + size]
+        }
+
+
+def flush():
+    """Записывает накопленные просмотры в Post.views.
+
+    Посты с одинаковым приростом обновляются одним запросом, так что
+    число UPDATE не превышает числа разных приростов. Рейтинг здесь
+    не пересчитывается: сброс идет в запросе читателя, пересчет делает
+    команда flush_views. Возвращает {post_id: n} записанного или None,
+    если сброс уже идет.
+    """
+    if not cache.add(LOCK_KEY, 1, settings.VIEWS_FLUSH_INTERVAL):
+        return None
+    try:
+        totals = Counter()
+        hours = defaultdict(dict)
+        for (post_id, hour), count in _take_pending().items():
+            totals[post_id] += count
+            hours[hour][post_id] = count
+        by_delta = defaultdict(list)
+        for post_id, count in totals.items():
+            by_delta[count].append(post_id)
+        batch = settings.VIEWS_FLUSH_BATCH_SIZE
+        for count, post_ids in by_delta.items():
+            for start in range(0, len(post_ids), batch):
+                Post.objects.filter(
+                    pk__in=post_ids[start:start + batch]).update(
+                        views=F('views') + count)
+        for chunk in _chunks(totals, batch):
+            sketches.persist(chunk)
+            add_author_views(chunk)
+        for hour, counts in hours.items():
+            moment = datetime.strptime(hour, HOUR_FORMAT)
+            for chunk in _chunks(counts, batch):
+                trending.add_to_buckets(chunk, moment)
+                daily.add_views(chunk, moment.date())
+        return dict(totals)
+    finally:
+        cache.delete(LOCK_KEY)
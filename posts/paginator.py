@@ -0,0 +1,188 @@
+import base64
+import binascii
+import json
+import math
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+from yatube.settings import PAR_PAGE
+
+FEED_ORDERING = ('-pub_date', '-id')
+
+
+def encode_cursor(values, direction):
+    """Упаковывает значения ключа и направление в непрозрачный токен."""
+    raw = json.dumps([direction, values], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора, для битого токена возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+def _plain(value):
+    """Значение ключа из токена, которое можно подставить в запрос:
+    строка, целое в пределах 64 бит или конечное дробное."""
+    if isinstance(value, str):
+        return True
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 63
+    return isinstance(value, float) and math.isfinite(value)
+
+
+class CursorPaginator:
+    """Пагинатор по ключу сортировки без COUNT(*) и OFFSET.
+
+    Значения полей ordering последнего (первого) объекта страницы
+    кодируются в токен, следующая страница выбирается условием
+    по этому ключу, поэтому стоимость не зависит от глубины.
+    Старые ссылки ?page=N обслуживаются одним запросом с OFFSET.
+
+    Возвращает обычный Page с обычным Paginator, чтобы шаблоны
+    и контекст не менялись; счетчики Paginator при этом не
+    вызываются, навигация строится по next_cursor/prev_cursor.
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+
+    def _field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _values(self, obj):
+        return [getattr(obj, name) for name in self._field_names()]
+
+    def _to_python(self, values):
+        """Значения ключа из токена; ValidationError для подделанных."""
+        model = self.object_list.model
+        result = []
+        for name, value in zip(self._field_names(), values):
+            if not _plain(value):
+                raise ValidationError('Битый курсор')
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                result.append(value)
+                continue
+            try:
+                value = field.to_python(value)
+            except (TypeError, ValueError):
+                raise ValidationError('Битый курсор')
+            field.run_validators(value)
+            result.append(value)
+        return result
+
+    def _keyset(self, values, forward):
+        """Условие «строго после ключа» в направлении обхода."""
+        clauses = []
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') == forward
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            equal = {
+                prev.lstrip('-'): values[j]
+                for j, prev in enumerate(self.ordering[:i])
+            }
+            clauses.append(Q(**equal, **{lookup: values[i]}))
+        return reduce(or_, clauses)
+
+    def _reversed_ordering(self):
+        return [
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        ]
+
+    def _build_page(self, rows, number, forward, cursor, has_more,
+                    has_before):
+        if not forward:
+            rows.reverse()
+        next_cursor = prev_cursor = None
+        if rows and (has_more if forward else has_before):
+            next_cursor = encode_cursor(self._values(rows[-1]), 'n')
+        if rows and (has_before if forward else has_more):
+            prev_cursor = encode_cursor(self._values(rows[0]), 'p')
+        page = Page(rows, number, self._paginator())
+        page.is_cursor = True
+        page.cursor = cursor
+        page.next_cursor = next_cursor
+        page.prev_cursor = prev_cursor
+        return page
+
+    def _paginator(self):
+        """Paginator для контекста шаблона; его счетчики не вызываются."""
+        return Paginator(
+            self.object_list.order_by(*self.ordering), self.per_page)
+
+    def _queryset(self, values, forward):
+        """Объекты после ключа values (или с начала) в порядке обхода."""
+        ordering = self.ordering if forward else self._reversed_ordering()
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset(values, forward))
+        return queryset
+
+    def _fetch(self, values, forward, offset=0):
+        """Строки окна страницы, не больше per_page + 1.
+        Подклассы могут подмешивать сюда другие источники."""
+        queryset = self._queryset(values, forward)
+        return list(queryset[offset:offset + self.per_page + 1])
+
+    def cursor_page(self, token):
+        """Страница после (или до) позиции, закодированной в токене."""
+        decoded = decode_cursor(token) if token else None
+        if decoded is None:
+            return self.number_page(1)
+        direction, values = decoded
+        if len(values) != len(self.ordering):
+            return self.number_page(1)
+        try:
+            values = self._to_python(values)
+        except ValidationError:
+            return self.number_page(1)
+        forward = direction == 'n'
+        rows = self._fetch(values, forward)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            return self.number_page(1)
+        return self._build_page(
+            rows, None, forward, token, has_more, has_before=True)
+
+    def number_page(self, number):
+        """Совместимость со ссылками ?page=N: один запрос с OFFSET."""
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        rows = self._fetch(None, True, offset=(number - 1) * self.per_page)
+        if not rows and number > 1:
+            return self.number_page(1)
+        has_more = len(rows) > self.per_page
+        return self._build_page(
+            rows[:self.per_page], number, True, None, has_more,
+            has_before=number > 1)
+
+
+def paginate(request, queryset=None, ordering=FEED_ORDERING,
+             per_page=PAR_PAGE, paginator=None):
+    """Страница ленты по параметрам запроса cursor или page."""
+    if paginator is None:
+        paginator = CursorPaginator(queryset, per_page, ordering)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.cursor_page(cursor)
+    return paginator.number_page(request.GET.get('page'))
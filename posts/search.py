@@ -0,0 +1,320 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite поиск идет по таблице FTS5 posts_post_fts (миграция
+0036_post_search): ранжирование BM25 и фрагменты текста с подсветкой
+найденных слов. FTS5 находит слова только по началу, поэтому слово,
+которое входит подстрокой в имя автора или название группы (индекс
+триграмм), тоже засчитывается: такие посты идут после ранжированных.
+На других базах — запасной путь: текст через icontains, имена
+и названия групп по триграммам, без ранжирования и подсветки.
+
+Операторы from:, to:, author:, group: и даты в запросе (search_query)
+проверяются индексированными условиями на posts_post, в текстовый
+поиск идет только остаток запроса.
+
+Ранжированный список id результатов ограничен SEARCH_LIMIT и на
+SEARCH_CACHE_TIMEOUT секунд кэшируется по нормализованному запросу,
+так что листание и повторы популярных запросов не трогают индекс.
+Страница подгружает только свои посты и фрагменты.
+"""
+import hashlib
+import re
+from datetime import datetime, time
+from functools import reduce
+from operator import and_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import trigrams
+from .models import Group, Post, Trigram, User
+from .paginator import CursorPaginator
+from .search_query import parse
+
+FTS_TABLE = 'posts_post_fts'
+CACHE_KEY = 'search:{}'
+# Веса колонок text, username, group_title для bm25: совпадение
+# в имени автора или названии группы весомее совпадения в тексте.
+WEIGHTS = (1.0, 2.0, 2.0)
+SNIPPET_TOKENS = 24
+# Метки подсветки из области частного использования Unicode: в тексте
+# поста их не бывает, и они переживают экранирование.
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+
+def terms(query):
+    """Слова запроса без символов синтаксиса FTS5."""
+    return re.findall(r'\w+', query or '')
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и заменяет метки на <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def _match(words):
+    # Каждое слово в кавычках — строка, а не оператор FTS5; звездочка
+    # ищет по префиксу.
+    return ' '.join('"{}"*'.format(word) for word in words)
+
+
+def _fetchall(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+# Структурные фильтры в SQL запроса к FTS5, соединенной с постами.
+FTS_CONDITIONS = {
+    'pub_date__gte': 'post.pub_date >= %s',
+    'pub_date__lt': 'post.pub_date < %s',
+    'author_id': 'post.author_id = %s',
+    'group_id': 'post.group_id = %s',
+}
+
+
+def _sql_param(value):
+    if isinstance(value, datetime):
+        return connection.ops.adapt_datetimefield_value(value)
+    return value
+
+
+def _fts_match(words, limit, lookups):
+    conditions = ''.join(
+        f' AND {FTS_CONDITIONS[name]}' for name in sorted(lookups))
+    rows = _fetchall(
+        f'SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} '
+        f'JOIN posts_post AS post ON post.id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s{conditions} '
+        f'ORDER BY bm25({FTS_TABLE}, %s, %s, %s) LIMIT %s',
+        [_match(words)]
+        + [_sql_param(lookups[name]) for name in sorted(lookups)]
+        + [*WEIGHTS, limit])
+    return [post_id for post_id, in rows]
+
+
+def _word_condition(word):
+    """SQL-условие «слово есть в тексте поста или подстрокой в имени
+    автора или названии группы» и его параметры; None, если
+    подстрокой слово нигде не встречается."""
+    users = trigrams.lookup(Trigram.USER, word)
+    groups = trigrams.lookup(Trigram.GROUP, word)
+    if not users and not groups:
+        return None
+    parts = [
+        f'post.id IN (SELECT rowid FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s)'
+    ]
+    params = [_match([word])]
+    for column, ids in (('author_id', users), ('group_id', groups)):
+        if ids:
+            placeholders = ', '.join(['%s'] * len(ids))
+            parts.append(f'post.{column} IN ({placeholders})')
+            params.extend(ids)
+    return f'({" OR ".join(parts)})', params
+
+
+def _substring_ids(words, limit, lookups):
+    """Новые посты, где слова, не найденные FTS5 по префиксу, входят
+    подстрокой в имя автора или название группы."""
+    found = {word: _word_condition(word) for word in words}
+    if not any(found.values()):
+        return []
+    conditions, params = [], []
+    for word in words:
+        condition = found[word] or (
+            f'post.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)', [_match([word])])
+        conditions.append(condition[0])
+        params.extend(condition[1])
+    for name in sorted(lookups):
+        conditions.append(FTS_CONDITIONS[name])
+        params.append(_sql_param(lookups[name]))
+    rows = _fetchall(
+        f'SELECT post.id FROM posts_post AS post '
+        f'WHERE {" AND ".join(conditions)} '
+        f'ORDER BY post.pub_date DESC, post.id DESC LIMIT %s',
+        params + [limit])
+    return [post_id for post_id, in rows]
+
+
+def _fts_ids(words, limit, lookups):
+    ids = _fts_match(words, limit, lookups)
+    seen = set(ids)
+    extra = [
+        post_id for post_id in _substring_ids(words, limit, lookups)
+        if post_id not in seen
+    ]
+    return ids + extra[:limit - len(ids)]
+
+
+def _fallback(words, limit, lookups=None):
+    # Подстроки имен и названий ищутся по индексу триграмм, без
+    # LIKE '%...%' и соединений с таблицами пользователей и групп.
+    posts = Post.objects.feed().filter(reduce(and_, (
+        Q(text__icontains=word)
+        | Q(author_id__in=trigrams.lookup(Trigram.USER, word))
+        | Q(group_id__in=trigrams.lookup(Trigram.GROUP, word))
+        for word in words
+    )), **(lookups or {}))
+    return list(posts[:limit])
+
+
+def _moment(day):
+    moment = datetime.combine(day, time.min)
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+
+def _lookups(parsed):
+    """Условия ORM для структурной части запроса; None, если автор
+    или группа не найдены и результатов заведомо нет."""
+    lookups = {}
+    if parsed.date_from:
+        lookups['pub_date__gte'] = _moment(parsed.date_from)
+    if parsed.date_to:
+        lookups['pub_date__lt'] = _moment(parsed.date_to)
+    if parsed.author:
+        lookups['author_id'] = User.objects.filter(
+            username=parsed.author).values_list('pk', flat=True).first()
+    if parsed.group:
+        lookups['group_id'] = Group.objects.filter(
+            Q(slug=parsed.group) | Q(title=parsed.group)).values_list(
+                'pk', flat=True).first()
+    if None in lookups.values():
+        return None
+    return lookups
+
+
+def _find_ids(parsed, limit):
+    words = terms(parsed.text)
+    lookups = _lookups(parsed)
+    if lookups is None:
+        return []
+    if not words:
+        # Только фильтры: новые посты по индексам (pub_date, id),
+        # (author, pub_date, id) или (group, pub_date, id).
+        return list(Post.objects.filter(**lookups).order_by(
+            '-pub_date', '-id').values_list('pk', flat=True)[:limit])
+    if fts_available():
+        return _fts_ids(words, limit, lookups)
+    return [post.id for post in _fallback(words, limit, lookups)]
+
+
+def ranked_ids(query, limit=None):
+    """id постов по запросу в порядке релевантности (без текста — по
+    дате), не больше limit (по умолчанию SEARCH_LIMIT). Результат
+    кэшируется."""
+    parsed = parse(query)
+    words = terms(parsed.text)
+    if not words and not any(parsed[1:]):
+        return []
+    limit = limit or settings.SEARCH_LIMIT
+    normalized = ' '.join(word.lower() for word in words)
+    key = CACHE_KEY.format(hashlib.md5(
+        f'{limit}:{normalized}:{parsed[1:]}'.encode()).hexdigest())
+    ids = cache.get(key)
+    if ids is None:
+        ids = _find_ids(parsed, limit)
+        cache.set(key, ids, settings.SEARCH_CACHE_TIMEOUT)
+    return ids
+
+
+def snippets(query, post_ids):
+    """Фрагменты с подсветкой для постов post_ids: {id: фрагмент}."""
+    words = terms(parse(query).text)
+    if not (words and post_ids and fts_available()):
+        return {}
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    rows = _fetchall(
+        f'SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) '
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+        f'AND rowid IN ({placeholders})',
+        [MARK_START, MARK_END, '…', SNIPPET_TOKENS, _match(words),
+         *post_ids])
+    return {post_id: highlight(snippet) for post_id, snippet in rows}
+
+
+def load(query, post_ids):
+    """Посты post_ids в том же порядке, с фрагментами в post.snippet."""
+    posts = Post.objects.feed().in_bulk(post_ids)
+    found = snippets(query, post_ids)
+    result = []
+    for post_id in post_ids:
+        post = posts.get(post_id)
+        if post is not None:
+            post.snippet = found.get(post_id)
+            result.append(post)
+    return result
+
+
+def find(query, limit=None):
+    """Посты по запросу query в порядке релевантности."""
+    return load(query, ranked_ids(query, limit))
+
+
+class SearchHit:
+    """Позиция результата в ранжированном списке и ее пост."""
+
+    def __init__(self, position, post_id):
+        self.position = position
+        self.post_id = post_id
+        self.post = None
+
+
+class SearchPaginator(CursorPaginator):
+    """Страницы результатов поиска по позиции в ранжированном списке.
+
+    Курсор хранит позицию, а ссылки навигации сохраняют параметр q,
+    поэтому следующая страница берет список из кэша и загружает
+    только свои посты.
+    """
+
+    def __init__(self, query, per_page):
+        super().__init__(None, per_page, ('position',))
+        self.query = query
+        self.ids = ranked_ids(query)
+
+    def _paginator(self):
+        return Paginator(self.ids, self.per_page)
+
+    def _to_python(self, values):
+        try:
+            return [int(values[0])]
+        except (TypeError, ValueError):
+            raise ValidationError('Битый курсор поиска')
+
+    def _window(self, values, forward, offset):
+        size = self.per_page + 1
+        if forward:
+            start = offset if values is None else values[0] + 1 + offset
+            return range(max(start, 0), min(start + size, len(self.ids)))
+        end = min(values[0], len(self.ids)) - offset
+        return range(end - 1, max(end - size, 0) - 1, -1)
+
+    def _fetch(self, values, forward, offset=0):
+        hits = [
+            SearchHit(position, self.ids[position])
+            for position in self._window(values, forward, offset)
+        ]
+        posts = {
+            post.id: post
+            for post in load(self.query, [hit.post_id for hit in hits])
+        }
+        for hit in hits:
+            hit.post = posts.get(hit.post_id)
+        # Пост могли удалить, пока список id лежал в кэше.
+        return [hit for hit in hits if hit.post is not None]
@@ -0,0 +1,130 @@
+"""Разбор поискового запроса на свободный текст и структурные фильтры.
+
+Операторы from:, to:, author: и group: и похожие на дату слова
+(2021-03, 25.03.2021, март 2021, 25 марта 2021) превращаются
+в диапазон дат и точные условия, которые поиск проверяет по индексам
+таблицы постов. В текстовый поиск уходит только остаток запроса.
+"""
+import re
+from collections import namedtuple
+from datetime import date, timedelta
+
+ParsedQuery = namedtuple(
+    'ParsedQuery', ['text', 'date_from', 'date_to', 'author', 'group'])
+
+OPERATOR = re.compile(r'^(from|to|author|group):(.+)$', re.IGNORECASE)
+ISO_DATE = re.compile(r'^(\d{4})-(\d{1,2})(?:-(\d{1,2}))?$')
+DOTTED_DATE = re.compile(r'^(?:(\d{1,2})\.)?(\d{1,2})\.(\d{4})$')
+YEAR = re.compile(r'^\d{4}$')
+DAY = re.compile(r'^\d{1,2}$')
+
+MONTHS = {}
+for number, forms in enumerate((
+        ('январь', 'января'), ('февраль', 'февраля'), ('март', 'марта'),
+        ('апрель', 'апреля'), ('май', 'мая'), ('июнь', 'июня'),
+        ('июль', 'июля'), ('август', 'августа'),
+        ('сентябрь', 'сентября'), ('октябрь', 'октября'),
+        ('ноябрь', 'ноября'), ('декабрь', 'декабря')), start=1):
+    for form in forms:
+        MONTHS[form] = number
+
+
+def _range(year, month=None, day=None):
+    """Полуоткрытый диапазон [начало, конец) года, месяца или дня;
+    None для несуществующей даты."""
+    try:
+        if day:
+            start = date(year, month, day)
+            return start, start + timedelta(days=1)
+        if month:
+            start = date(year, month, 1)
+            return start, date(year + month // 12, month % 12 + 1, 1)
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    except ValueError:
+        return None
+
+
+def parse_date(token, allow_year=False):
+    """Диапазон дат для одного слова или None."""
+    match = ISO_DATE.match(token)
+    if match:
+        year, month, day = match.groups()
+        return _range(int(year), int(month), day and int(day))
+    match = DOTTED_DATE.match(token)
+    if match:
+        day, month, year = match.groups()
+        return _range(int(year), int(month), day and int(day))
+    if allow_year and YEAR.match(token):
+        return _range(int(token))
+    return None
+
+
+def _spoken_date(tokens, i):
+    """«март 2021» или «25 марта 2021» с позиции i: (диапазон, длина).
+
+    Для несуществующей даты («31 февраля 2021») диапазон None, а длина
+    фразы сохраняется, чтобы она целиком ушла в текст.
+    """
+    day = None
+    if DAY.match(tokens[i]) and i + 1 < len(tokens):
+        day = int(tokens[i])
+        i += 1
+    month = MONTHS.get(tokens[i].lower())
+    if month is None or i + 1 >= len(tokens) or not YEAR.match(tokens[i + 1]):
+        return None, 0
+    return _range(int(tokens[i + 1]), month, day), 3 if day else 2
+
+
+def _narrow(bounds, found):
+    """Сужает [from, to) до пересечения с диапазоном found."""
+    start, end = found
+    date_from, date_to = bounds
+    return (
+        max(date_from, start) if date_from else start,
+        min(date_to, end) if date_to else end,
+    )
+
+
+def _operator(name, value, bounds, filters):
+    """Применяет оператор, False — если значение не разобралось."""
+    if name in ('author', 'group'):
+        filters[name] = value
+        return True
+    found = parse_date(value, allow_year=True)
+    if found is None:
+        return False
+    date_from, date_to = bounds
+    if name == 'from':
+        bounds[0] = max(date_from, found[0]) if date_from else found[0]
+    else:
+        bounds[1] = min(date_to, found[1]) if date_to else found[1]
+    return True
+
+
+def parse(query):
+    """Разбирает запрос в ParsedQuery; даты — datetime.date,
+    date_to не включается в диапазон."""
+    tokens = (query or '').split()
+    bounds = [None, None]
+    filters = {}
+    text = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        operator = OPERATOR.match(token)
+        if operator and _operator(
+                operator.group(1).lower(), operator.group(2), bounds,
+                filters):
+            i += 1
+            continue
+        found, length = _spoken_date(tokens, i)
+        if not length:
+            found, length = parse_date(token), 1
+        if found:
+            bounds[:] = _narrow(bounds, found)
+        else:
+            text.extend(tokens[i:i + length])
+        i += length
+    return ParsedQuery(
+        ' '.join(text), bounds[0], bounds[1],
+        filters.get('author'), filters.get('group'))
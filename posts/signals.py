@@ -0,0 +1,166 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import daily, images, suggest, timeline, trigrams
+from .counters import (GROUPS_VERSION_KEY, bump, bump_author, bump_group,
+                       touch, touch_stats)
+from .models import (AuthorStat, Comment, Follow, Group, Post, Trigram,
+                     User)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    if created:
+        AuthorStat.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    """Имя пользователя попадает в индекс триграмм и подсказки."""
+    if update_fields is not None and 'username' not in update_fields:
+        # Например, обновление last_login при входе.
+        return
+    trigrams.index(Trigram.USER, instance.pk, instance.username)
+    suggest.update(
+        suggest.USER, instance.pk, instance.username, instance.username,
+        [instance.username])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    trigrams.remove(Trigram.USER, instance.pk)
+    suggest.remove(suggest.USER, instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежние группу и картинку, чтобы перенести счетчик
+    постов и снять ссылку на замененный файл."""
+    instance._old_group_id = None
+    instance._old_image = None
+    # Новый файл еще не записан: при сохранении хранилище добавит ссылку.
+    instance._image_uploaded = bool(
+        instance.image) and not instance.image._committed
+    if instance.pk is None:
+        return
+    if update_fields is not None and not {'group', 'image'} & set(
+            update_fields):
+        instance._old_group_id = instance.group_id
+        instance._old_image = instance.image.name
+        return
+    instance._old_group_id, instance._old_image = Post.objects.filter(
+        pk=instance.pk).values_list('group_id', 'image').first() or (
+        None, None)
+
+
+@receiver(pre_save, sender=Post)
+def post_image_described(sender, instance, update_fields=None, **kwargs):
+    """Размеры, формат и заглушка картинки считаются один раз,
+    когда загружается новый файл."""
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    image = instance.image
+    if not image:
+        instance.image_width = instance.image_height = None
+        instance.image_format = instance.image_placeholder = ''
+        return
+    if image._committed:
+        return
+    meta = images.describe(image.file)
+    instance.image_width, instance.image_height = meta.width, meta.height
+    instance.image_format = meta.format
+    instance.image_placeholder = meta.placeholder
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    """Новый пост попадает в ленты подписчиков автора."""
+    if created:
+        timeline.fan_out(instance)
+        # new_post сохраняет пост сразу с первым просмотром автора.
+        bump_author(
+            instance.author_id, posts_count=1, views_sum=instance.views)
+        daily.record(
+            instance.author_id, instance.group_id,
+            instance.pub_date.date(), posts=1)
+        if instance.group_id:
+            bump_group(instance.group_id, post_count=1)
+        return
+    old_group_id = getattr(instance, '_old_group_id', instance.group_id)
+    if old_group_id != instance.group_id:
+        if old_group_id:
+            bump_group(old_group_id, post_count=-1)
+        if instance.group_id:
+            bump_group(instance.group_id, post_count=1)
+    old_image = getattr(instance, '_old_image', None)
+    uploaded = getattr(instance, '_image_uploaded', False)
+    # Тот же файл, загруженный заново, получил лишнюю ссылку.
+    if old_image and (old_image != instance.image.name or uploaded):
+        instance.image.storage.delete(old_image)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_author(
+        instance.author_id, posts_count=-1, views_sum=-instance.views)
+    timeline.forget_recent_posts(instance.author_id)
+    if instance.group_id:
+        bump_group(instance.group_id, post_count=-1)
+    if instance.image:
+        instance.image.storage.delete(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        bump(Post.objects.filter(pk=instance.post_id), comment_count=1)
+        post = instance.post
+        daily.record(
+            post.author_id, post.group_id, instance.created.date(),
+            comments=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump(Post.objects.filter(pk=instance.post_id), comment_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """Подписка добавляет посты автора в ленту подписчика."""
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+        bump_author(instance.author_id, followers_count=1)
+        bump_author(instance.user_id, following_count=1)
+        timeline.follower_added(instance.author_id)
+        daily.record(instance.author_id, follows=1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Отписка убирает посты автора из ленты."""
+    timeline.prune(instance.user_id, instance.author_id)
+    bump_author(instance.author_id, followers_count=-1)
+    bump_author(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    """Название группы входит в данные статистики и каталог групп."""
+    touch_stats()
+    touch(GROUPS_VERSION_KEY)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    trigrams.index(Trigram.GROUP, instance.pk, instance.title)
+    suggest.update(
+        suggest.GROUP, instance.pk, instance.title, instance.slug,
+        [instance.title, instance.slug])
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    trigrams.remove(Trigram.GROUP, instance.pk)
+    suggest.remove(suggest.GROUP, instance.pk)
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from .hll import HyperLogLog
+from .models import Post, PostSketch
+
+CACHE_KEY = 'hll:{}:{:%Y%m%d%H}'
+# Часы поста, чьи скетчи лежат в кэше и еще не сохранены целиком.
+PENDING_KEY = 'hll:pending:{}'
+TOTAL_START = datetime(1970, 1, 1)
+
+
+def hour_start(moment=None):
+    moment = moment or datetime.now()
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def add_visitor(post_id, visitor, moment=None):
+    """Добавляет читателя в часовой скетч поста в кэше.
+
+    Повторный просмотр того же читателя почти никогда не меняет
+    регистры, и тогда кэш не перезаписывается.
+    """
+    hour = hour_start(moment)
+    key = CACHE_KEY.format(post_id, hour)
+    data = cache.get(key)
+    if data is None:
+        _mark_pending(post_id, hour)
+    sketch = HyperLogLog.from_bytes(data) if data else HyperLogLog()
+    if sketch.add(visitor):
+        # Скетч живет в кэше, пока сброс не сохранит его прошедший час.
+        cache.set(key, sketch.to_bytes(), None)
+
+
+def _mark_pending(post_id, hour):
+    key = PENDING_KEY.format(post_id)
+    hours = cache.get(key) or []
+    if hour not in hours:
+        cache.set(key, hours + [hour], None)
+
+
+def _pending_hours(post_ids, current):
+    """{post_id: часы} несохраненных скетчей; текущий и прошлый час
+    читаются всегда на случай, если список вытеснен из кэша."""
+    pending = cache.get_many([PENDING_KEY.format(pk) for pk in post_ids])
+    recent = {current - timedelta(hours=1), current}
+    return {
+        post_id: recent | set(pending.get(PENDING_KEY.format(post_id), []))
+        for post_id in post_ids
+    }
+
+
+def _forget_past(post_hours, current):
+    """Убирает из кэша сохраненные скетчи прошедших часов."""
+    cache.delete_many([
+        CACHE_KEY.format(post_id, hour)
+        for post_id, hours in post_hours.items()
+        for hour in hours if hour < current
+    ])
+    # Текущий час еще пополняется и будет сохранен следующим сбросом.
+    cache.set_many({
+        PENDING_KEY.format(post_id): [current] for post_id in post_hours
+    }, None)
+
+
+def _merge_rows(period, start, sketches):
+    """Вливает скетчи {post_id: HyperLogLog} в строки PostSketch,
+    возвращает получившиеся скетчи.
+
+    Строки читаются одним SELECT, новые вставляются bulk_create,
+    существующие обновляются bulk_update, а не запросом на пост.
+    """
+    merged = {}
+    existing = {
+        row.post_id: row for row in PostSketch.objects.filter(
+            post_id__in=list(sketches), period=period, start=start)
+    }
+    created = []
+    for post_id, sketch in sketches.items():
+        row = existing.get(post_id)
+        if row is None:
+            created.append(PostSketch(
+                post_id=post_id, period=period, start=start,
+                registers=sketch.to_bytes()))
+            merged[post_id] = sketch
+            continue
+        sketch = HyperLogLog.from_bytes(row.registers).merge(sketch)
+        row.registers = sketch.to_bytes()
+        merged[post_id] = sketch
+    PostSketch.objects.bulk_create(created)
+    PostSketch.objects.bulk_update(existing.values(), ['registers'])
+    return merged
+
+
+def _raise_unique_views(counts):
+    """Поднимает Post.unique_views до оценок {post_id: n} одним UPDATE.
+
+    Оценка, засеянная просмотрами до скетчей, не уменьшается.
+    """
+    if not counts:
+        return
+    estimate = Case(
+        *[When(pk=post_id, then=Value(count))
+          for post_id, count in counts.items()],
+        default=F('unique_views'), output_field=IntegerField())
+    Post.objects.filter(pk__in=list(counts)).update(
+        unique_views=Greatest('unique_views', estimate))
+
+
+def persist(post_ids, moment=None):
+    """Сохраняет кэшированные скетчи постов в базу и обновляет
+    Post.unique_views по общему скетчу. Вызывается из сброса
+    просмотров, повторное слияние того же скетча ничего не меняет.
+
+    Читаются все часы из списка несохраненных, а не только последние:
+    на тихом сайте сброс может прийти через много часов после просмотра.
+    Прошедшие часы после сохранения удаляются из кэша.
+    """
+    current = hour_start(moment)
+    post_hours = _pending_hours(post_ids, current)
+    keys = {
+        CACHE_KEY.format(post_id, hour): (post_id, hour)
+        for post_id, hours in post_hours.items() for hour in hours
+    }
+    cached = cache.get_many(list(keys))
+    by_hour = {}
+    for key, data in cached.items():
+        post_id, hour = keys[key]
+        by_hour.setdefault(hour, {})[post_id] = HyperLogLog.from_bytes(data)
+    totals = {}
+    with transaction.atomic():
+        for hour, sketches in by_hour.items():
+            _merge_rows(PostSketch.HOUR, hour, sketches)
+            for post_id, sketch in sketches.items():
+                totals.setdefault(post_id, HyperLogLog()).merge(sketch)
+        merged = _merge_rows(PostSketch.TOTAL, TOTAL_START, totals)
+        _raise_unique_views({
+            post_id: sketch.count() for post_id, sketch in merged.items()
+        })
+    _forget_past(post_hours, current)
+
+
+def unique_views(post_id, period=PostSketch.TOTAL, start=TOTAL_START):
+    """Оценка уникальных читателей поста за сохраненный период."""
+    row = PostSketch.objects.filter(
+        post_id=post_id, period=period, start=start).first()
+    return HyperLogLog.from_bytes(row.registers).count() if row else 0
+
+
+def rollup(before):
+    """Сворачивает часовые скетчи до before в дневные, по дню за раз."""
+    hours = PostSketch.objects.filter(
+        period=PostSketch.HOUR, start__lt=before)
+    total = 0
+    for day in hours.datetimes('start', 'day'):
+        rows = hours.filter(
+            start__gte=day, start__lt=day + timedelta(days=1))
+        sketches = {}
+        for post_id, registers in rows.values_list('post_id', 'registers'):
+            sketches.setdefault(post_id, HyperLogLog()).merge(
+                HyperLogLog.from_bytes(registers))
+        with transaction.atomic():
+            _merge_rows(PostSketch.DAY, day, sketches)
+            total += rows.delete()[0]
+    return total
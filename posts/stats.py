@@ -0,0 +1,77 @@
+"""Наборы данных страниц статистики.
+
+Страница статистики отдает только оболочку, данные графика приходят
+отдельным JSON-запросом. ETag ответа строится из версии счетчиков
+(counters.stats_version) и параметров запроса, поэтому повторный
+запрос с If-None-Match проверяется без чтения счетчиков: версия
+берется из кэша процесса и не чаще раза в пару секунд из базы.
+"""
+import hashlib
+from collections import namedtuple
+
+from . import daily, leaderboard
+from .counters import stats_version
+from .models import DailyAuthorStat, DailyGroupStat
+
+LIMIT = 5
+
+Stat = namedtuple('Stat', [
+    'nav', 'title', 'label', 'chart', 'all_time', 'model', 'key', 'field',
+])
+
+
+def _authors(by):
+    def rows(limit):
+        return [
+            (stat.user.username, getattr(stat, by))
+            for stat in leaderboard.top_authors(limit, by=by)
+        ]
+    return rows
+
+
+def _groups(limit):
+    return [
+        (group.title, group.post_count)
+        for group in leaderboard.top_groups(limit)
+    ]
+
+
+STATS = {
+    'author': Stat(
+        'stat_author_nav', 'Авторы', 'Количество постов автора', 'bar',
+        _authors('posts_count'), DailyAuthorStat, 'author__username',
+        'posts'),
+    'group': Stat(
+        'stat_group_nav', 'Группы', 'Количество постов в группе', 'bar',
+        _groups, DailyGroupStat, 'group__title', 'posts'),
+    'view': Stat(
+        'stat_view_nav', 'Просмотры', 'Сумма просмотров всех постов',
+        'radar', _authors('views_sum'), DailyAuthorStat,
+        'author__username', 'views'),
+    'follow': Stat(
+        'stat_follow_nav', 'Подписчики', 'Количество подписчиков', 'bar',
+        _authors('followers_count'), DailyAuthorStat, 'author__username',
+        'follows'),
+}
+
+
+def dataset(kind, date_from=None, date_to=None, limit=LIMIT):
+    """Данные графика kind: общие счетчики или, если задан диапазон
+    дат, суммы дневных сводок."""
+    stat = STATS[kind]
+    if date_from or date_to:
+        rows = daily.top(
+            stat.model, stat.key, stat.field, date_from, date_to, limit)
+    else:
+        rows = stat.all_time(limit)
+    return {
+        'label': stat.label,
+        'labels': [name for name, _ in rows],
+        'data': [value for _, value in rows],
+    }
+
+
+def etag(kind, date_from='', date_to=''):
+    """ETag набора данных: из счетчиков читается только их версия."""
+    key = f'{kind}:{date_from}:{date_to}:{stats_version()}'
+    return hashlib.md5(key.encode()).hexdigest()
@@ -0,0 +1,107 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется SHA-256 своих байтов, поэтому повторная загрузка той же
+картинки не пишет новый файл и не плодит новые миниатюры: имя, а с ним
+и ключи sorl, совпадают. Сколько постов ссылается на файл, хранит
+модель Blob; удаление снимает одну ссылку, а сам файл стирается вместе
+с последней. Файлы, загруженные до появления хранилища и не прошедшие
+команду dedup_images, записей Blob не имеют и не удаляются никогда.
+"""
+import hashlib
+import os
+from collections import defaultdict
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+def _blob_model():
+    # models.py подключает хранилище, прямой импорт был бы циклическим.
+    from .models import Blob
+    return Blob
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, где имя файла — хеш его содержимого."""
+
+    def content_name(self, name, content):
+        """Имя файла по хешу content в каталоге name с его расширением."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest.hexdigest() + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if not self.exists(name):
+            # При параллельной записи того же файла FileSystemStorage
+            # выберет свободное имя, получится лишняя, но верная копия.
+            name = super()._save(name, content)
+        acquire(name, content.size)
+        return name
+
+    def delete(self, name):
+        """Снимает ссылку на файл; файл стирается с последней ссылкой
+        после фиксации транзакции: при откате ссылка вернется, и файл
+        должен остаться на месте."""
+        if not name:
+            return
+        with transaction.atomic():
+            blob = _blob_model().objects.select_for_update().filter(
+                name=name).first()
+            if blob is None:
+                return
+            if blob.refs > 1:
+                type(blob).objects.filter(pk=blob.pk).update(
+                    refs=F('refs') - 1)
+                return
+            blob.delete()
+        remove = super().delete
+        transaction.on_commit(lambda: remove(name))
+
+
+def acquire(name, size):
+    """Добавляет ссылку на файл name, заводя запись при первой."""
+    Blob = _blob_model()
+    with transaction.atomic():
+        blob, created = Blob.objects.select_for_update().get_or_create(
+            name=name, defaults={'size': size, 'refs': 1})
+        if not created:
+            Blob.objects.filter(pk=blob.pk).update(refs=F('refs') + 1)
+
+
+def dedup(storage, directory, model, field, dry_run=False):
+    """Переименовывает файлы directory по хешу содержимого, дубликаты
+    удаляет, ссылки field модели model переводит на новые имена и
+    пересчитывает записи Blob. Возвращает пару (файлов, удалено копий).
+    """
+    Blob = _blob_model()
+    _, files = storage.listdir(directory)
+    groups = defaultdict(list)
+    for filename in sorted(files):
+        name = f'{directory}/{filename}'
+        with storage.open(name) as content:
+            groups[storage.content_name(name, content)].append(name)
+    # Из каждой группы остается один файл с именем target.
+    removed = sum(len(names) - 1 for names in groups.values())
+    if dry_run:
+        return len(groups), removed
+    for target, names in groups.items():
+        with transaction.atomic():
+            if not storage.exists(target):
+                os.replace(storage.path(names[0]), storage.path(target))
+            model.objects.filter(**{f'{field}__in': names}).update(
+                **{field: target})
+            Blob.objects.update_or_create(name=target, defaults={
+                'size': storage.size(target),
+                'refs': model.objects.filter(**{field: target}).count(),
+            })
+        for name in names:
+            if name != target and os.path.exists(storage.path(name)):
+                os.remove(storage.path(name))
+    return len(groups), removed
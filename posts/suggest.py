@@ -0,0 +1,340 @@
+"""Подсказки для строки поиска из индекса префиксов в памяти процесса.
+
+Ключи (имена пользователей, названия и slug групп, частые запросы)
+лежат в отсортированном списке, параллельный список хранит их записи.
+Диапазон ключей префикса находится двумя bisect. Для префиксов, у которых
+в диапазоне больше SCAN_LIMIT ключей, индекс держит готовые списки лучших
+по весу записей, остальные диапазоны невелики и просматриваются целиком.
+Ответ не обращается к базе. Индекс строится при первом запросе и дальше
+обновляется сигналами по одной записи; все операции идут под
+блокировкой, индекс общий для потоков процесса.
+"""
+import os
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from .models import Group
+from .search import terms
+
+User = get_user_model()
+
+USER = 'user'
+GROUP = 'group'
+QUERY = 'query'
+# Префиксы с диапазоном больше SCAN_LIMIT ключей отвечают из готовых
+# списков лучших записей. В списке от TOP_SIZE до 2 * TOP_SIZE записей:
+# запас позволяет удалять записи без пересчета по всему диапазону.
+SCAN_LIMIT = 200
+TOP_SIZE = 20
+# Подсказкой становится запрос не длиннее стольких символов и слов.
+QUERY_MAX_LENGTH = 50
+QUERY_MAX_WORDS = 4
+
+
+def _keys(*texts):
+    """Ключи записи: строка целиком и каждое ее слово со своего начала."""
+    keys = set()
+    for text in texts:
+        text = (text or '').lower()
+        keys.add(text)
+        keys.update(
+            text[i + 1:] for i, char in enumerate(text) if char == ' ')
+    keys.discard('')
+    return keys
+
+
+def _prefixes(key, allowed):
+    """Префиксы key по возрастанию длины, пока они есть в allowed."""
+    for length in range(1, len(key) + 1):
+        if key[:length] not in allowed:
+            return
+        yield key[:length]
+
+
+def _url(kind, target):
+    if kind == USER:
+        return reverse('profile', args=[target])
+    if kind == GROUP:
+        return reverse('page_group', args=[target])
+    return f'{reverse("search")}?{urlencode({"q": target})}'
+
+
+class PrefixIndex:
+    """Отсортированные массивы ключей и записей с поиском по префиксу.
+
+    Список лучших префикса всегда содержит первые по _rank записи его
+    диапазона: все записи вне списка стоят ниже последней в нем.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._entries = []
+        # (kind, id) -> (запись, ее ключи, вес).
+        self._objects = {}
+        # Префикс с большим диапазоном -> лучшие записи по _rank.
+        self._top = {}
+
+    def _rank(self, entry):
+        return -self._objects[entry[:2]][2], entry[2]
+
+    def _span(self, prefix):
+        return (bisect_left(self._keys, prefix),
+                bisect_left(self._keys, prefix + '\U0010ffff'))
+
+    def _scan(self, prefix):
+        """Все записи, у которых ключ начинается с prefix."""
+        start, end = self._span(prefix)
+        return set(self._entries[start:end])
+
+    def _hot(self, keys):
+        """Префиксы ключей, диапазон которых больше SCAN_LIMIT."""
+        hot = set()
+        for key in keys:
+            for length in range(1, len(key) + 1):
+                start, end = self._span(key[:length])
+                if end - start <= SCAN_LIMIT:
+                    break
+                hot.add(key[:length])
+        return hot
+
+    def _refill(self, prefix):
+        entries = self._scan(prefix)
+        if len(entries) <= SCAN_LIMIT:
+            self._top.pop(prefix, None)
+            return
+        self._top[prefix] = sorted(entries, key=self._rank)[:2 * TOP_SIZE]
+
+    def _offer(self, entry, keys):
+        """Ставит запись в списки лучших, где она выше последней."""
+        for prefix in self._hot(keys):
+            top = self._top.get(prefix)
+            if top is None:
+                self._refill(prefix)
+                continue
+            rank = self._rank(entry)
+            if entry not in top and rank < self._rank(top[-1]):
+                top.insert(bisect_left(
+                    [self._rank(other) for other in top], rank), entry)
+                del top[2 * TOP_SIZE:]
+
+    def _withdraw(self, entry, keys):
+        """Убирает запись из списков лучших; короткий список
+        пересобирается по диапазону."""
+        prefixes = {
+            key[:length] for key in keys for length in range(1, len(key) + 1)
+        }
+        for prefix in prefixes:
+            top = self._top.get(prefix)
+            if top and entry in top:
+                top.remove(entry)
+                if len(top) < TOP_SIZE:
+                    self._refill(prefix)
+
+    def load(self, records):
+        """Заполняет пустой индекс записями (kind, id, label, target,
+        texts, weight) одной сортировкой вместо вставок по одной."""
+        with self._lock:
+            pairs = []
+            for kind, object_id, label, target, texts, weight in records:
+                entry = (kind, object_id, label, target)
+                keys = _keys(*texts)
+                self._objects[(kind, object_id)] = (entry, keys, weight)
+                pairs.extend((key, entry) for key in keys)
+            pairs.sort(key=lambda pair: pair[0])
+            self._keys = [key for key, _ in pairs]
+            self._entries = [entry for _, entry in pairs]
+            # Диапазон больше SCAN_LIMIT ключей у префикса, если он общий
+            # для ключей, стоящих через SCAN_LIMIT друг от друга.
+            hot = set()
+            for low, high in zip(self._keys, self._keys[SCAN_LIMIT:]):
+                common = os.path.commonprefix([low, high])
+                if common not in hot:
+                    hot.update(common[:length]
+                               for length in range(1, len(common) + 1))
+            ranked = sorted(
+                self._objects.values(), key=lambda found: self._rank(
+                    found[0]))
+            for entry, keys, _ in ranked:
+                for key in keys:
+                    for prefix in _prefixes(key, hot):
+                        top = self._top.setdefault(prefix, [])
+                        if len(top) < 2 * TOP_SIZE and entry not in top:
+                            top.append(entry)
+
+    def add(self, kind, object_id, label, target, texts, weight=None):
+        """Добавляет или заменяет запись объекта; без weight вес
+        прежней записи сохраняется."""
+        entry = (kind, object_id, label, target)
+        keys = _keys(*texts)
+        with self._lock:
+            old = self._objects.get((kind, object_id))
+            if weight is None:
+                weight = old[2] if old else 0
+            if old and old[:2] == (entry, keys):
+                # Изменился только вес: ключи на месте, запись лишь
+                # переставляется в списках лучших.
+                self._objects[(kind, object_id)] = (entry, keys, weight)
+                self._withdraw(entry, keys)
+                self._offer(entry, keys)
+                return
+            self.remove(kind, object_id)
+            for key in keys:
+                position = bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._entries.insert(position, entry)
+            self._objects[(kind, object_id)] = (entry, keys, weight)
+            self._offer(entry, keys)
+
+    def remove(self, kind, object_id):
+        with self._lock:
+            found = self._objects.get((kind, object_id))
+            if found is None:
+                return
+            entry, keys, _ = found
+            for key in keys:
+                position = bisect_left(self._keys, key)
+                while self._entries[position] != entry:
+                    position += 1
+                del self._keys[position]
+                del self._entries[position]
+            self._withdraw(entry, keys)
+            del self._objects[(kind, object_id)]
+
+    def weight(self, kind, object_id):
+        found = self._objects.get((kind, object_id))
+        return found[2] if found else 0
+
+    def lookup(self, prefix, limit):
+        """Лучшие по весу записи, у которых ключ начинается с prefix."""
+        prefix = prefix.lower()
+        with self._lock:
+            top = self._top.get(prefix)
+            if top is not None and limit <= len(top):
+                return top[:limit]
+            return sorted(self._scan(prefix), key=self._rank)[:limit]
+
+    def stats(self):
+        """Размер индекса и оценка занятой памяти в байтах."""
+        with self._lock:
+            top = sys.getsizeof(self._top) + sum(
+                sys.getsizeof(prefix) + sys.getsizeof(entries)
+                for prefix, entries in self._top.items())
+            keys = sys.getsizeof(self._keys) + sum(
+                sys.getsizeof(key) for key in self._keys)
+            entries = sys.getsizeof(self._entries) + sum(
+                sys.getsizeof(entry) + sys.getsizeof(entry[2])
+                for entry, _, _ in self._objects.values())
+            return {
+                'objects': len(self._objects),
+                'keys': len(self._keys),
+                'keys_bytes': keys,
+                'entries_bytes': entries,
+                'objects_bytes': sys.getsizeof(self._objects),
+                'top_prefixes': len(self._top),
+                'top_bytes': top,
+                'total_bytes': (
+                    keys + entries + top + sys.getsizeof(self._objects)),
+            }
+
+
+_index = None
+_queries = Counter()
+_lock = threading.Lock()
+
+
+def build():
+    """Новый индекс из базы: пользователи с весом по подписчикам,
+    группы с весом по числу постов и уже частые запросы."""
+    records = [
+        (USER, pk, username, username, [username], followers or 0)
+        for pk, username, followers in User.objects.values_list(
+            'pk', 'username', 'stat__followers_count').iterator()
+    ]
+    records.extend(
+        (GROUP, pk, title, slug, [title, slug], posts)
+        for pk, title, slug, posts in Group.objects.values_list(
+            'pk', 'title', 'slug', 'post_count').iterator())
+    records.extend(
+        (QUERY, query, query, query, [query], count)
+        for query, count in _queries.items()
+        if count >= settings.SUGGEST_QUERY_MIN_COUNT)
+    index = PrefixIndex()
+    index.load(records)
+    return index
+
+
+def get_index():
+    global _index
+    with _lock:
+        if _index is None:
+            _index = build()
+        return _index
+
+
+def reset():
+    """Забывает индекс и счетчики запросов (для тестов)."""
+    global _index
+    with _lock:
+        _index = None
+        _queries.clear()
+
+
+def update(kind, object_id, label, target, texts, weight=None):
+    """Обновляет запись, только если индекс уже построен: сигнал
+    не должен запускать чтение всех пользователей."""
+    if _index is not None:
+        _index.add(kind, object_id, label, target, texts, weight)
+
+
+def remove(kind, object_id):
+    if _index is not None:
+        _index.remove(kind, object_id)
+
+
+def record_query(query):
+    """Учитывает поисковый запрос, который нашел посты; запрос, заданный
+    не меньше SUGGEST_QUERY_MIN_COUNT раз, становится подсказкой.
+
+    В подсказки попадают только слова запроса, не больше
+    QUERY_MAX_WORDS слов и QUERY_MAX_LENGTH символов.
+    """
+    words = terms(query)
+    query = ' '.join(words).lower()
+    if (not query or len(words) > QUERY_MAX_WORDS
+            or len(query) > QUERY_MAX_LENGTH):
+        return
+    with _lock:
+        _queries[query] += 1
+        count = _queries[query]
+        if len(_queries) > settings.SUGGEST_MAX_QUERIES:
+            # Редкие запросы вытесняются вместе со своими подсказками,
+            # частые остаются.
+            kept = dict(
+                _queries.most_common(settings.SUGGEST_MAX_QUERIES // 2))
+            for evicted in set(_queries) - set(kept):
+                remove(QUERY, evicted)
+            _queries.clear()
+            _queries.update(kept)
+            count = _queries[query]
+    if count >= settings.SUGGEST_QUERY_MIN_COUNT:
+        update(QUERY, query, query, query, [query], count)
+
+
+def suggest(prefix, limit=None):
+    """Подсказки для префикса: список словарей kind, text, url."""
+    prefix = (prefix or '').strip()
+    if not prefix:
+        return []
+    entries = get_index().lookup(prefix, limit or settings.SUGGEST_LIMIT)
+    return [
+        {'kind': kind, 'text': label, 'url': _url(kind, target)}
+        for kind, _, label, target in entries
+    ]
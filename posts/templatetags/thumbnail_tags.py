@@ -0,0 +1,18 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('include/picture.html', takes_context=True)
+def picture(context, image, css_class='', width=None, placeholder=''):
+    """<picture> с лестницей ширин в WebP и JPEG из готовых миниатюр;
+    placeholder показывается фоном, пока картинка грузится. Миниатюры
+    берутся из собранных лентой thumbnails, если они есть."""
+    return {
+        'picture': thumbnails.picture(
+            image, width, context.get('thumbnails')),
+        'css_class': css_class,
+        'placeholder': placeholder,
+    }
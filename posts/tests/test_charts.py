@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import charts
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class ChartsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(title='<b>Группа</b>', slug='group')
+        Post.objects.create(text='Текст', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def chart_url(self, name):
+        return self.client.get(reverse(name)).context['chart_url']
+
+    def test_chart_is_cached_svg(self):
+        """График отдается в SVG с долгим кэшированием, повторно
+        без запросов к базе, подписи экранируются."""
+        url = self.chart_url('stat_group')
+        response = self.client.get(url)
+        self.assertEqual(
+            response['Content-Type'], 'image/svg+xml; charset=utf-8')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={charts.MAX_AGE}', response['Cache-Control'])
+        svg = response.content.decode()
+        self.assertIn('&lt;b&gt;Группа&lt;/b&gt;', svg)
+        self.assertNotIn('<b>', svg)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content.decode(), svg)
+
+    def test_chart_url_follows_rollups(self):
+        """Изменение счетчиков меняет адрес графика, старый адрес
+        без перенаправления отдает текущий график ненадолго."""
+        old_url = self.chart_url('stat_author')
+        Post.objects.create(text='Еще', author=self.user)
+        new_url = self.chart_url('stat_author')
+        self.assertNotEqual(old_url, new_url)
+        response = self.client.get(old_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('>2</text>', response.content.decode())
+        self.assertIn(
+            f'max-age={charts.STALE_MAX_AGE}', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertEqual(
+            self.client.get(new_url).content, response.content)
+
+    def test_version_shared_between_processes(self):
+        """Версия счетчиков берется из базы: процесс с пустым кэшем
+        выдает тот же адрес графика."""
+        url = self.chart_url('stat_author')
+        cache.clear()
+        self.assertEqual(self.chart_url('stat_author'), url)
+
+    def test_render(self):
+        """Лепестковая диаграмма рисует многоугольник данных, пустой
+        набор — подпись «Нет данных»."""
+        dataset = {'label': 'Просмотры', 'labels': ['a', 'b', 'c'],
+                   'data': [1, 2, 3]}
+        self.assertEqual(charts.render('radar', dataset).count('<polygon'),
+                         charts.GRID_STEPS + 1)
+        dataset.update(labels=[], data=[])
+        self.assertIn('Нет данных', charts.render('bar', dataset))
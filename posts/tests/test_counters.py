@@ -0,0 +1,320 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import daily, leaderboard, pageviews
+from posts.models import (AuthorStat, Comment, DailyAuthorStat,
+                          DailyGroupStat, Follow, Group, Post)
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other_group = Group.objects.create(title='Другая', slug='other')
+
+    def refresh(self, obj):
+        obj.refresh_from_db()
+        return obj
+
+    def test_comment_count(self):
+        """Комментарии увеличивают и уменьшают Post.comment_count."""
+        post = Post.objects.create(text='Текст', author=self.user)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        self.assertEqual(self.refresh(post).comment_count, 2)
+        comment.delete()
+        self.assertEqual(self.refresh(post).comment_count, 1)
+
+    def test_group_post_count(self):
+        """Group.post_count следует за созданием, переносом и удалением."""
+        post = Post.objects.create(
+            text='Текст', author=self.user, group=self.group)
+        self.assertEqual(self.refresh(self.group).post_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(self.refresh(self.group).post_count, 0)
+        self.assertEqual(self.refresh(self.other_group).post_count, 1)
+        post.delete()
+        self.assertEqual(self.refresh(self.other_group).post_count, 0)
+
+    def test_site_post_deleted(self):
+        """Пост, созданный через new_post, удаляется, а просмотры
+        автора возвращаются к нулю."""
+        self.client.force_login(self.user)
+        self.client.post(reverse('new_post'), {'text': 'С сайта'})
+        post = Post.objects.get(text='С сайта')
+        stat = AuthorStat.objects.get(user=self.user)
+        self.assertEqual(stat.views_sum, post.views)
+        post.delete()
+        stat.refresh_from_db()
+        self.assertEqual((stat.posts_count, stat.views_sum), (0, 0))
+
+    def test_drifted_counters_survive_delete(self):
+        """Удаление поста, созданного мимо сигналов, не падает
+        на разошедшихся счетчиках: они остаются нулевыми."""
+        Post.objects.bulk_create([
+            Post(text='Мимо сигналов', author=self.reader, group=self.group,
+                 views=5)])
+        post = Post.objects.get(text='Мимо сигналов')
+        Comment.objects.bulk_create([
+            Comment(post=post, author=self.user, text='Тоже')])
+        Comment.objects.get(text='Тоже').delete()
+        post.delete()
+        stat = AuthorStat.objects.get(user=self.reader)
+        self.assertEqual((stat.posts_count, stat.views_sum), (0, 0))
+        self.assertEqual(self.refresh(self.group).post_count, 0)
+
+    def test_follow_counts(self):
+        """Подписка и отписка меняют счетчики обоих пользователей."""
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(
+            AuthorStat.objects.get(user=self.user).followers_count, 1)
+        self.assertEqual(
+            AuthorStat.objects.get(user=self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(
+            AuthorStat.objects.get(user=self.user).followers_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет расхождение счетчиков."""
+        post = Post.objects.create(
+            text='Текст', author=self.user, group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        Follow.objects.create(user=self.reader, author=self.user)
+        Post.objects.update(comment_count=7)
+        Group.objects.update(post_count=7)
+        AuthorStat.objects.all().delete()
+
+        call_command('recount', stdout=StringIO())
+
+        self.assertEqual(self.refresh(post).comment_count, 1)
+        self.assertEqual(self.refresh(self.group).post_count, 1)
+        self.assertEqual(
+            AuthorStat.objects.get(user=self.user).followers_count, 1)
+        self.assertEqual(
+            AuthorStat.objects.get(user=self.reader).following_count, 1)
+
+
+class LeaderboardTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='star')
+        cls.other = User.objects.create_user(username='other')
+        cls.fans = [
+            User.objects.create_user(username=f'fan{i}') for i in range(3)]
+        cls.star_post = Post.objects.create(text='Звезда', author=cls.star)
+        Post.objects.create(text='Другой', author=cls.other)
+
+    def test_best_author_without_follows(self):
+        """Страница лучшего автора не падает без подписок."""
+        response = self.client.get(reverse('best_author'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), 0)
+
+    def test_leader_pages(self):
+        """best_author и stat_follow читают таблицу лидеров."""
+        for fan in self.fans:
+            Follow.objects.create(user=fan, author=self.star)
+        Follow.objects.create(user=self.fans[0], author=self.other)
+
+        response = self.client.get(reverse('best_author'))
+        self.assertEqual(
+            [post.id for post in response.context['page']],
+            [self.star_post.id])
+        data = self.client.get(reverse('stat_data', args=['follow'])).json()
+        self.assertEqual(data['labels'], ['star', 'other'])
+        self.assertEqual(data['data'], [3, 1])
+
+    def test_check_and_rebuild(self):
+        """Сверка находит расхождение, пересборка его устраняет."""
+        Follow.objects.create(user=self.fans[0], author=self.star)
+        AuthorStat.objects.filter(user=self.star).update(followers_count=5)
+        out = StringIO()
+        call_command('follower_leaderboard', '--check', stdout=out)
+        self.assertIn('Расхождений: 1', out.getvalue())
+
+        call_command('follower_leaderboard', stdout=StringIO())
+        self.assertEqual(leaderboard.drift(), [])
+
+
+class StatisticTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.writer = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(text=i, author=cls.writer, group=cls.group)
+            for i in range(3)
+        ]
+        Post.objects.create(text='Другой', author=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def context(self, kind):
+        data = self.client.get(reverse('stat_data', args=[kind])).json()
+        return data['labels'], data['data']
+
+    def test_stat_pages_read_rollups(self):
+        """Страницы статистики строятся по поддерживаемым счетчикам."""
+        self.assertEqual(
+            self.context('author'), (['writer', 'reader'], [3, 1]))
+        self.assertEqual(self.context('group'), (['Группа'], [3]))
+
+        for post, views in zip(self.posts, (4, 2, 1)):
+            for i in range(views):
+                pageviews.record_view(post, f'visitor{i}')
+        pageviews.flush()
+        self.assertEqual(self.context('view'), (['writer'], [7]))
+
+        self.posts[0].refresh_from_db()
+        self.posts[0].delete()
+        self.assertEqual(self.context('view'), (['writer'], [3]))
+        self.assertEqual(
+            self.context('author'), (['writer', 'reader'], [2, 1]))
+
+    def test_stat_data_etag(self):
+        """Данные статистики отдаются с ETag, повторный запрос получает
+        304 без обращения к базе, изменение счетчиков меняет ETag."""
+        url = reverse('stat_data', args=['author'])
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        ranged = self.client.get(url, {'date_from': '2020-01-01'})
+        self.assertNotEqual(ranged['ETag'], etag)
+
+        Post.objects.create(text='Новый', author=self.reader)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(
+            response.json()['labels'], ['writer', 'reader'])
+
+    def test_stat_page_is_shell(self):
+        """Страница статистики не содержит данных, а ссылается на JSON."""
+        response = self.client.get(reverse('stat_group'))
+        self.assertNotIn('labels', response.context)
+        self.assertContains(
+            response, reverse('stat_data', args=['group']))
+        self.assertEqual(
+            self.client.get(reverse('stat_data', args=['x'])).status_code,
+            404)
+
+    def test_recount_repairs_author_rollups(self):
+        """Сверка recount восстанавливает суммы авторов."""
+        Post.objects.filter(pk=self.posts[0].pk).update(views=5)
+        AuthorStat.objects.update(posts_count=0, views_sum=0)
+        call_command('recount', stdout=StringIO())
+        stat = AuthorStat.objects.get(user=self.writer)
+        self.assertEqual((stat.posts_count, stat.views_sum), (3, 5))
+
+
+class DailyStatTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.writer = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            text='Текст', author=cls.writer, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def context(self, kind, **params):
+        data = self.client.get(
+            reverse('stat_data', args=[kind]), params).json()
+        return data['labels'], data['data']
+
+    def test_events_go_to_daily_rollups(self):
+        """Посты, комментарии, подписки и просмотры попадают в сводку
+        текущего дня."""
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.writer)
+        pageviews.record_view(self.post, 'visitor')
+        pageviews.flush()
+        stat = DailyAuthorStat.objects.get(
+            author=self.writer, date=date.today())
+        self.assertEqual(
+            (stat.posts, stat.comments, stat.follows, stat.views),
+            (1, 1, 1, 1))
+        group_stat = DailyGroupStat.objects.get(
+            group=self.group, date=date.today())
+        self.assertEqual(
+            (group_stat.posts, group_stat.comments, group_stat.views),
+            (1, 1, 1))
+
+    def test_range_filter(self):
+        """С диапазоном дат статистика суммирует дневные сводки."""
+        old = date.today() - timedelta(days=10)
+        daily.record(self.reader.pk, self.group.pk, old, posts=5)
+        self.assertEqual(
+            self.context('author'), (['writer'], [1]))
+        self.assertEqual(
+            self.context('author', date_to=old.isoformat()),
+            (['reader'], [5]))
+        self.assertEqual(
+            self.context('group', date_from=old.isoformat()),
+            (['Группа'], [6]))
+        self.assertEqual(
+            self.context('author', date_from='не дата'),
+            (['writer'], [1]))
+
+    def test_backfill_command(self):
+        """Команда backfill_daily_stats пересобирает сводки из истории."""
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        DailyAuthorStat.objects.all().delete()
+        DailyGroupStat.objects.all().delete()
+        call_command('backfill_daily_stats', chunk_size=1, stdout=StringIO())
+        stat = DailyAuthorStat.objects.get(author=self.writer)
+        self.assertEqual((stat.posts, stat.comments), (1, 1))
+        self.assertEqual(DailyGroupStat.objects.get().posts, 1)
+
+    def test_backfill_keeps_pruned_views(self):
+        """Просмотры за дни, корзины которых удалены пересчетом рейтинга,
+        переживают пересборку сводок."""
+        old = date.today() - timedelta(days=10)
+        daily.record(self.writer.pk, self.group.pk, old, views=7)
+        pageviews.record_view(self.post, 'visitor')
+        pageviews.flush()
+        call_command('backfill_daily_stats', stdout=StringIO())
+        self.assertEqual(dict(DailyAuthorStat.objects.values_list(
+            'date', 'views')), {old: 7, date.today(): 1})
+        self.assertEqual(
+            DailyAuthorStat.objects.get(date=date.today()).posts, 1)
+        self.assertEqual(
+            DailyGroupStat.objects.get(date=old).posts, 0)
+
+    def test_backfill_keeps_follows(self):
+        """Подписки восстановить не из чего, пересборка их не стирает."""
+        Follow.objects.create(user=self.reader, author=self.writer)
+        call_command('backfill_daily_stats', stdout=StringIO())
+        stat = DailyAuthorStat.objects.get(
+            author=self.writer, date=date.today())
+        self.assertEqual((stat.posts, stat.follows), (1, 1))
@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import images, thumbnails
+from posts.models import Post
+from posts.tests.test_thumbnails import image_file
+
+User = get_user_model()
+
+
+def jpeg_file(size=(2000, 1000)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'blue').save(buffer, 'JPEG')
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ImageMetaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = override_settings(
+            MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+        cls.media.enable()
+        cls.user = User.objects.create_user(username='writer')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
+        super().tearDownClass()
+
+    def setUp(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cache.clear()
+
+    def test_describe_jpeg(self):
+        """Размеры исходника, формат и заглушка не больше 16 точек."""
+        meta = images.describe(jpeg_file())
+        self.assertEqual(meta[:3], (2000, 1000, 'JPEG'))
+        self.assertTrue(meta.placeholder.startswith('data:image/png;base64,'))
+        self.assertLess(len(meta.placeholder), 300)
+
+    def test_filled_on_upload(self):
+        """Поля заполняются при загрузке и очищаются со снятием картинки,
+        карточка берет заглушку из поста."""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=jpeg_file())
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_format),
+            (2000, 1000, 'JPEG'))
+        self.assertContains(
+            self.client.get(reverse('index')), post.image_placeholder)
+
+        post.image = None
+        post.save()
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(
+            (post.image_width, post.image_format, post.image_placeholder),
+            (None, '', ''))
+
+    def test_srcset_without_upscaled_widths(self):
+        """Ширины больше исходника в srcset не попадают."""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=image_file())
+        thumbnails.enqueue(post.image)
+        picture = thumbnails.picture(post.image, post.image_width)
+        self.assertIn(' 960w', picture['jpeg'])
+        self.assertNotIn(' 1920w', picture['jpeg'])
+
+    def test_fill_command(self):
+        """Команда заполняет поля постов, загруженных раньше."""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=jpeg_file())
+        Post.objects.filter(pk=post.pk).update(
+            image_width=None, image_height=None, image_format='',
+            image_placeholder='')
+        out = StringIO()
+        call_command('fill_image_meta', stdout=out)
+        self.assertIn('Заполнено постов: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2000, 1000))
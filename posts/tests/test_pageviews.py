@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import pageviews, trending
+from posts.models import Post, PostViewBucket, TrendingPost
+from posts.sketches import hour_start
+
+User = get_user_model()
+
+
+class PageViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Текст', author=cls.author)
+        cls.url = reverse('post', args=[cls.author.username, cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+        # Таймер сброса еще не истек.
+        cache.set(pageviews.TIMER_KEY, 1)
+        self.guest_client = Client()
+
+    def tearDown(self):
+        cache.clear()
+
+    def views_in_db(self):
+        return Post.objects.values_list('views', flat=True).get(
+            pk=self.post.pk)
+
+    def test_views_are_buffered_and_shown(self):
+        """Просмотры копятся в кэше, но сразу видны на странице."""
+        for _ in range(3):
+            response = self.guest_client.get(self.url)
+        self.assertEqual(self.views_in_db(), 0)
+        self.assertEqual(response.context['post'].views, 3)
+
+    def test_flush_command_writes_views(self):
+        """Команда flush_views переносит просмотры в базу."""
+        for _ in range(3):
+            self.guest_client.get(self.url)
+        out = StringIO()
+        call_command('flush_views', stdout=out)
+        self.assertEqual(self.views_in_db(), 3)
+        # В тестах кэш локальный: команда предупреждает, что из другого
+        # процесса она буфер воркеров не увидит.
+        self.assertIn('одному процессу', out.getvalue())
+        self.assertEqual(pageviews.pending(self.post.pk), 0)
+
+        self.guest_client.get(self.url)
+        pageviews.flush()
+        self.assertEqual(self.views_in_db(), 4)
+
+    @override_settings(VIEWS_FLUSH_THRESHOLD=2)
+    def test_threshold_triggers_flush(self):
+        """Буфер сбрасывается после порогового числа просмотров."""
+        self.guest_client.get(self.url)
+        self.assertEqual(self.views_in_db(), 0)
+        self.guest_client.get(self.url)
+        self.assertEqual(self.views_in_db(), 2)
+
+    def test_views_go_to_their_hour(self):
+        """Просмотры попадают в корзину часа, когда они случились,
+        а не часа сброса; сброс рейтинг не пересчитывает."""
+        earlier = datetime.now() - timedelta(hours=3)
+        pageviews.record_view(self.post, 'visitor', earlier)
+        pageviews.record_view(self.post, 'visitor', earlier)
+        pageviews.record_view(self.post, 'visitor')
+        self.assertEqual(pageviews.flush(), {self.post.pk: 3})
+        self.assertEqual(self.views_in_db(), 3)
+        self.assertEqual(dict(PostViewBucket.objects.filter(
+            post=self.post).values_list('hour', 'views')), {
+                hour_start(earlier): 2, hour_start(): 1})
+        self.assertFalse(TrendingPost.objects.exists())
+
+        call_command('flush_views', stdout=StringIO())
+        self.assertTrue(TrendingPost.objects.filter(post=self.post).exists())
+
+    def test_author_views_are_not_counted(self):
+        """Автор не накручивает просмотры своему посту."""
+        client = Client()
+        client.force_login(self.author)
+        client.get(self.url)
+        self.assertEqual(pageviews.pending(self.post.pk), 0)
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.old = Post.objects.create(text='Вчерашний', author=cls.author)
+        cls.fresh = Post.objects.create(text='Свежий', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_recent_views_outrank_old_views(self):
+        """Свежие просмотры весят больше старых, страница идет по месту."""
+        now = datetime.now()
+        trending.add_to_buckets(
+            {self.old.pk: 30}, now - timedelta(hours=30))
+        trending.add_to_buckets({self.fresh.pk: 10}, now)
+        trending.add_to_buckets({self.fresh.pk: 5}, now)
+        self.assertEqual(PostViewBucket.objects.get(
+            post=self.fresh).views, 15)
+
+        call_command('recompute_trending', stdout=StringIO())
+
+        response = Client().get(reverse('best_trending'))
+        self.assertEqual(
+            [post.pk for post in response.context['page']],
+            [self.fresh.pk, self.old.pk])
+
+    @override_settings(TRENDING_WINDOW_HOURS=24)
+    def test_expired_buckets_are_pruned(self):
+        """Пересчет удаляет корзины старше окна."""
+        now = datetime.now()
+        trending.add_to_buckets({self.old.pk: 30}, now - timedelta(hours=30))
+        trending.add_to_buckets({self.fresh.pk: 10}, now)
+        self.assertEqual(trending.recompute(now), 1)
+        self.assertEqual(
+            list(PostViewBucket.objects.values_list('post_id', flat=True)),
+            [self.fresh.pk])
@@ -0,0 +1,218 @@
+import re
+from datetime import date, datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from yatube.settings import PAR_PAGE
+
+from posts import search
+from posts.models import Group, Post
+from posts.search_query import parse
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(title='Котики', slug='cats')
+        cls.mention = Post.objects.create(
+            text='Вчера видел <b>кошку</b> и собаку', author=cls.user)
+        cls.twice = Post.objects.create(
+            text='Кошку гладили, кошку кормили', author=cls.user)
+        cls.in_group = Post.objects.create(
+            text='Без нужных слов', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def ids(self, query):
+        return [post.id for post in search.find(query)]
+
+    def test_bm25_ranking_and_prefix(self):
+        """Чаще упомянутое слово выше, слово ищется по префиксу
+        и без учета регистра."""
+        self.assertEqual(self.ids('КОШК'), [self.twice.id, self.mention.id])
+        self.assertEqual(self.ids('кошку собаку'), [self.mention.id])
+
+    def test_username_and_group_title(self):
+        """Находятся посты по имени автора и названию группы."""
+        self.assertEqual(self.ids('котики'), [self.in_group.id])
+        self.assertEqual(len(self.ids('leo')), 3)
+
+    def test_index_follows_changes(self):
+        """Триггеры обновляют индекс при правке поста и группы."""
+        self.in_group.text = 'Теперь про кошку'
+        self.in_group.save()
+        self.assertIn(self.in_group.id, self.ids('кошку'))
+        Group.objects.filter(pk=self.group.pk).update(title='Собачки')
+        self.assertEqual(self.ids('собачки'), [self.in_group.id])
+        self.mention.delete()
+        self.assertNotIn(self.mention.id, self.ids('кошку'))
+
+    def test_username_and_group_substring(self):
+        """Слово из середины имени автора или названия группы находит
+        посты, как поиск по подстроке до FTS5."""
+        author = User.objects.create_user(username='nightriddler')
+        group = Group.objects.create(title='Photography', slug='photo')
+        by_author = Post.objects.create(text='Загадка', author=author)
+        in_group = Post.objects.create(
+            text='Снимок', author=self.user, group=group)
+        self.assertEqual(self.ids('riddl'), [by_author.id])
+        self.assertEqual(self.ids('graphy'), [in_group.id])
+        self.assertEqual(self.ids('graphy снимок'), [in_group.id])
+        self.assertEqual(self.ids('кормили'), [self.twice.id])
+
+    def test_snippet_is_escaped(self):
+        """Фрагмент экранирован, найденное слово подсвечено."""
+        post = search.find('собаку')[0]
+        self.assertIn('<mark>собаку</mark>', post.snippet)
+        self.assertIn('&lt;b&gt;', post.snippet)
+        response = self.client.get(reverse('search'), {'q': 'собаку'})
+        self.assertContains(response, '<mark>собаку</mark>')
+
+    def test_syntax_is_not_interpreted(self):
+        """Операторы FTS5 в запросе не ломают поиск."""
+        self.assertEqual(self.ids('"кошку" OR NEAR(*'), [])
+        self.assertEqual(self.ids(''), [])
+        self.assertEqual(
+            self.client.get(reverse('search')).status_code, 200)
+
+    def test_fallback(self):
+        """Запасной путь без FTS5 ищет все слова запроса."""
+        self.assertEqual(
+            {post.id for post in search._fallback(['кошку'], None)},
+            {self.mention.id, self.twice.id})
+        self.assertEqual(
+            [post.id for post in search._fallback(['Котики', 'слов'], 5)],
+            [self.in_group.id])
+
+
+class SearchPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+        Post.objects.bulk_create([
+            Post(text=f'Запись {i}', author=cls.user)
+            for i in range(PAR_PAGE * 2 + 5)
+        ])
+        # bulk_create не вызывает сигналы, но триггеры FTS5 срабатывают.
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def walk(self, params):
+        """Проходит страницы по ссылкам «Следующая», возвращает id."""
+        url = reverse('search')
+        seen = []
+        while True:
+            response = self.client.get(url, params)
+            page = response.context['page']
+            seen.extend(post.id for post in page)
+            if not page.next_cursor:
+                return seen
+            link = re.search(
+                r'href="(\?[^"]*cursor=[^"]*)">Следующая',
+                response.content.decode()).group(1)
+            self.assertIn('q=', link)
+            params = {'q': params['q'], 'cursor': page.next_cursor}
+
+    def test_cursor_pages_keep_query(self):
+        """Результаты идут страницами по PAR_PAGE, курсор хранит q."""
+        response = self.client.get(reverse('search'), {'q': 'запись'})
+        self.assertEqual(len(response.context['page']), PAR_PAGE)
+        seen = self.walk({'q': 'запись'})
+        self.assertEqual(len(seen), PAR_PAGE * 2 + 5)
+        self.assertEqual(len(set(seen)), len(seen))
+
+    @override_settings(SEARCH_LIMIT=PAR_PAGE + 3)
+    def test_result_set_is_capped(self):
+        """Результатов не больше SEARCH_LIMIT."""
+        self.assertEqual(len(self.walk({'q': 'запись'})), PAR_PAGE + 3)
+
+    def test_results_are_cached(self):
+        """Повторный запрос не обращается к индексу FTS5."""
+        self.client.get(reverse('search'), {'q': 'запись'})
+        with self.assertNumQueries(2):
+            # Посты страницы и их фрагменты.
+            self.client.get(reverse('search'), {'q': 'Запись'})
+
+
+class StructuredQueryTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.leo = User.objects.create_user(username='leo')
+        cls.anna = User.objects.create_user(username='anna')
+        cls.group = Group.objects.create(title='Котики', slug='cats')
+        cls.march = Post.objects.create(
+            text='Весенняя кошка', author=cls.leo, group=cls.group)
+        cls.april = Post.objects.create(text='Апрельская кошка',
+                                        author=cls.anna)
+        Post.objects.filter(pk=cls.march.pk).update(
+            pub_date=datetime(2021, 3, 25, 12))
+        Post.objects.filter(pk=cls.april.pk).update(
+            pub_date=datetime(2021, 4, 1, 0, 0))
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def ids(self, query):
+        return [post.id for post in search.find(query)]
+
+    def test_parse(self):
+        """Даты и операторы уходят в фильтры, остальное — в текст."""
+        self.assertEqual(
+            parse('кошка 2021-03'),
+            ('кошка', date(2021, 3, 1), date(2021, 4, 1), None, None))
+        self.assertEqual(
+            parse('25 марта 2021')[1:3],
+            (date(2021, 3, 25), date(2021, 3, 26)))
+        self.assertEqual(
+            parse('25.03.2021')[1:3], parse('2021-03-25')[1:3])
+        self.assertEqual(
+            parse('from:2021 to:02.2021 author:leo group:cats x'),
+            ('x', date(2021, 1, 1), date(2021, 3, 1), 'leo', 'cats'))
+        self.assertEqual(parse('2021-13 from:вчера')[0], '2021-13 from:вчера')
+        self.assertEqual(parse('май 2021')[1], date(2021, 5, 1))
+        self.assertEqual(
+            parse('кошка 31 февраля 2021'),
+            ('кошка 31 февраля 2021', None, None, None, None))
+
+    def test_date_ranges(self):
+        """Диапазон дат проверяется по pub_date, граница не включается."""
+        self.assertEqual(self.ids('кошка март 2021'), [self.march.id])
+        self.assertEqual(self.ids('кошка 2021-04'), [self.april.id])
+        self.assertEqual(self.ids('25.03.2021'), [self.march.id])
+        self.assertEqual(
+            self.ids('to:2021-03'), [self.march.id])
+        self.assertEqual(
+            self.ids('from:2021-03-26'), [self.april.id])
+
+    def test_author_and_group_operators(self):
+        """author: и group: — точные фильтры, неизвестные дают пусто."""
+        self.assertEqual(self.ids('кошка author:anna'), [self.april.id])
+        self.assertEqual(self.ids('group:cats'), [self.march.id])
+        self.assertEqual(self.ids('group:Котики кошка'), [self.march.id])
+        self.assertEqual(self.ids('author:nobody'), [])
+
+    def test_fallback_applies_filters(self):
+        """Запасной путь применяет те же фильтры."""
+        self.assertIsNone(search._lookups(parse('author:nobody')))
+        lookups = search._lookups(parse('author:leo from:2021'))
+        self.assertEqual(
+            search._fallback(['кошка'], None, lookups), [self.march])
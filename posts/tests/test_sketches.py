@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from posts import sketches
+from posts.hll import HyperLogLog
+from posts.models import Post, PostSketch
+
+User = get_user_model()
+
+
+class HyperLogLogTest(TestCase):
+    def test_count_is_close_to_cardinality(self):
+        """Оценка укладывается в несколько процентов от точного числа."""
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(f'visitor-{i}')
+            sketch.add(f'visitor-{i}')
+        self.assertAlmostEqual(sketch.count(), 20000, delta=20000 * 0.05)
+
+    def test_merge_equals_union(self):
+        """Слияние скетчей оценивает объединение множеств."""
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(3000):
+            first.add(i)
+        for i in range(2000, 5000):
+            second.add(i)
+        merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+        self.assertAlmostEqual(merged.count(), 5000, delta=5000 * 0.05)
+        self.assertEqual(len(merged.to_bytes()), 4096)
+
+
+class SketchStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Текст', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_persist_updates_unique_views(self):
+        """Повторные просмотры не увеличивают число уникальных читателей."""
+        for visitor in ['a', 'b', 'a', 'c', 'a']:
+            sketches.add_visitor(self.post.pk, visitor)
+        sketches.persist([self.post.pk])
+        sketches.persist([self.post.pk])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.unique_views, 3)
+
+    def test_idle_hours_are_not_lost(self):
+        """Скетч часа, до которого сброс добрался только через сутки,
+        сохраняется, а сохраненный прошлый час уходит из кэша."""
+        moment = datetime(2021, 3, 25, 10)
+        for visitor in ['a', 'b']:
+            sketches.add_visitor(self.post.pk, visitor, moment)
+        sketches.add_visitor(self.post.pk, 'c', moment + timedelta(hours=1))
+        sketches.persist([self.post.pk], moment + timedelta(days=1))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.unique_views, 3)
+        self.assertIsNone(cache.get(
+            sketches.CACHE_KEY.format(self.post.pk, moment)))
+
+    def test_seeded_unique_views_kept(self):
+        """Оценка из просмотров до скетчей не уменьшается сбросом."""
+        Post.objects.filter(pk=self.post.pk).update(unique_views=10)
+        sketches.add_visitor(self.post.pk, 'a')
+        sketches.persist([self.post.pk])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.unique_views, 10)
+
+    def test_persist_queries_do_not_grow_with_posts(self):
+        """Сохранение скетчей пачки постов тратит одинаковое число
+        запросов на 3 и на 27 постов, для новых и существующих строк."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.author) for i in range(30))
+        post_ids = list(Post.objects.exclude(pk=self.post.pk).values_list(
+            'pk', flat=True))
+        counts = []
+        for chunk in (post_ids[:3], post_ids[3:]):
+            for _ in range(2):
+                for post_id in chunk:
+                    sketches.add_visitor(post_id, f'visitor-{post_id}')
+                    sketches.add_visitor(post_id, 'common')
+                with CaptureQueriesContext(connection) as queries:
+                    sketches.persist(chunk)
+                counts.append(len(queries))
+        self.assertEqual(counts[:2], counts[2:])
+        self.assertEqual(
+            set(Post.objects.filter(pk__in=post_ids).values_list(
+                'unique_views', flat=True)), {2})
+
+    def test_rollup_merges_hours_into_day(self):
+        """Часовые скетчи сворачиваются в дневной без потери читателей."""
+        day = datetime(2021, 3, 25)
+        for hour, visitors in enumerate([['a', 'b'], ['b', 'c']]):
+            moment = day + timedelta(hours=hour)
+            for visitor in visitors:
+                sketches.add_visitor(self.post.pk, visitor, moment)
+            sketches.persist([self.post.pk], moment)
+
+        self.assertEqual(sketches.rollup(day + timedelta(days=1)), 2)
+        self.assertFalse(PostSketch.objects.filter(
+            period=PostSketch.HOUR).exists())
+        self.assertEqual(
+            sketches.unique_views(self.post.pk, PostSketch.DAY, day), 3)
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from posts.models import Blob, Post
+from posts.tests.test_thumbnails import image_file
+
+User = get_user_model()
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTest(TransactionTestCase):
+    """Файлы стираются после фиксации транзакции, поэтому тесты идут
+    без обертки TestCase в транзакцию."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = override_settings(
+            MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
+        super().tearDownClass()
+
+    def setUp(self):
+        # Одинаковые картинки разных тестов попали бы в один файл.
+        self.uploads = os.path.join(settings.MEDIA_ROOT, 'posts')
+        shutil.rmtree(self.uploads, ignore_errors=True)
+        self.user = User.objects.create_user(username='writer')
+
+    def create(self, image):
+        return Post.objects.create(text='Текст', author=self.user, image=image)
+
+    def test_same_content_stored_once(self):
+        """Одинаковые картинки под разными именами — один файл по хешу
+        и две ссылки на него; файл стирается с последней ссылкой."""
+        first = self.create(image_file('one.PNG'))
+        second = self.create(image_file('two.png'))
+        self.assertEqual(first.image.name, second.image.name)
+        digest = hashlib.sha256(image_file().read()).hexdigest()
+        self.assertEqual(first.image.name, f'posts/{digest}.png')
+        self.assertEqual(len(os.listdir(self.uploads)), 1)
+        self.assertEqual(Blob.objects.get(name=first.image.name).refs, 2)
+
+        path = first.image.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(Blob.objects.get(name=second.image.name).refs, 1)
+        Post.objects.get(pk=second.pk).delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_replaced_image_released(self):
+        """Замена картинки снимает ссылку на прежний файл."""
+        post = self.create(image_file())
+        old_path = post.image.path
+        post = Post.objects.get(pk=post.pk)
+        post.image = image_file(size=(10, 10))
+        post.save()
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(
+            list(Blob.objects.values_list('name', 'refs')),
+            [(post.image.name, 1)])
+
+    def test_same_file_uploaded_again(self):
+        """Повторная загрузка того же файла в пост не добавляет ссылку."""
+        post = self.create(image_file())
+        post = Post.objects.get(pk=post.pk)
+        post.image = image_file('again.png')
+        post.save()
+        blob = Blob.objects.get(name=post.image.name)
+        self.assertEqual(blob.refs, 1)
+        path = post.image.path
+        post.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_rollback_keeps_file(self):
+        """Откат удаления поста оставляет и ссылку, и файл."""
+        post = self.create(image_file())
+        path = post.image.path
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Post.objects.get(pk=post.pk).delete()
+                raise RuntimeError
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(Blob.objects.get(name=post.image.name).refs, 1)
+
+    def test_dedup_command(self):
+        """Команда переводит старые файлы на имена по хешу и удаляет
+        одинаковые копии."""
+        plain = FileSystemStorage()
+        content = image_file().read()
+        names = [
+            plain.save('posts/photo.jpg', ContentFile(content)),
+            plain.save('posts/photo.jpg', ContentFile(content)),
+        ]
+        self.assertNotEqual(*names)
+        for name in names:
+            Post.objects.filter(pk=self.create(None).pk).update(image=name)
+
+        out = StringIO()
+        call_command('dedup_images', stdout=out)
+        self.assertIn('Файлов: 1. Удалено копий: 1.', out.getvalue())
+        target = f'posts/{hashlib.sha256(content).hexdigest()}.jpg'
+        self.assertEqual(
+            set(Post.objects.values_list('image', flat=True)), {target})
+        self.assertEqual(
+            os.listdir(self.uploads), [os.path.basename(target)])
+        self.assertEqual(Blob.objects.get(name=target).refs, 2)
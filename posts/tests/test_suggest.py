@@ -0,0 +1,156 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import suggest
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class SuggestTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.leo = User.objects.create_user(username='leo')
+        cls.lena = User.objects.create_user(username='lena')
+        cls.group = Group.objects.create(
+            title='Русская проза', slug='prose')
+        Follow.objects.create(user=cls.leo, author=cls.lena)
+        Post.objects.create(text='Лев Толстой, Война и мир', author=cls.leo)
+
+    def setUp(self):
+        suggest.reset()
+
+    def tearDown(self):
+        suggest.reset()
+
+    def texts(self, prefix):
+        return [item['text'] for item in suggest.suggest(prefix)]
+
+    def test_prefix_lookup(self):
+        """Подсказки по префиксу имени, слова названия и slug группы;
+        выше те, у кого больше подписчиков."""
+        self.assertEqual(self.texts('LE'), ['lena', 'leo'])
+        self.assertEqual(self.texts('про'), ['Русская проза'])
+        self.assertEqual(self.texts('pros'), ['Русская проза'])
+        self.assertEqual(self.texts('x'), [])
+
+    def test_endpoint_without_queries(self):
+        """Эндпоинт отвечает JSON из памяти, без запросов к базе."""
+        suggest.get_index()
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse('search_suggest'), {'q': 'leo'})
+        self.assertEqual(response.json(), {
+            'query': 'leo',
+            'suggestions': [{
+                'kind': 'user', 'text': 'leo',
+                'url': reverse('profile', args=['leo'])}],
+        })
+
+    def test_incremental_updates(self):
+        """Сигналы обновляют построенный индекс по одной записи."""
+        suggest.get_index()
+        User.objects.create_user(username='lev')
+        leo = User.objects.get(pk=self.leo.pk)
+        leo.username = 'tolstoy'
+        leo.save()
+        Group.objects.get(pk=self.group.pk).delete()
+        self.assertEqual(self.texts('le'), ['lena', 'lev'])
+        self.assertEqual(self.texts('tol'), ['tolstoy'])
+        self.assertEqual(self.texts('про'), [])
+        stats = suggest.get_index().stats()
+        self.assertEqual(stats['objects'], 3)
+        self.assertGreater(stats['total_bytes'], 0)
+
+    @override_settings(SUGGEST_QUERY_MIN_COUNT=2)
+    def test_frequent_queries(self):
+        """Повторяющийся поисковый запрос становится подсказкой."""
+        suggest.get_index()
+        self.client.get(reverse('search'), {'q': 'Лев Толстой'})
+        self.assertEqual(self.texts('лев'), [])
+        self.client.get(reverse('search'), {'q': 'лев  толстой'})
+        item = suggest.suggest('лев')[0]
+        self.assertEqual(item['text'], 'лев толстой')
+        self.assertEqual(
+            item['url'], reverse('search') + '?q=%D0%BB%D0%B5%D0%B2+'
+            '%D1%82%D0%BE%D0%BB%D1%81%D1%82%D0%BE%D0%B9')
+
+    @override_settings(SUGGEST_QUERY_MIN_COUNT=1)
+    def test_queries_without_results(self):
+        """Запрос, который ничего не нашел, и слишком длинный запрос
+        подсказками не становятся."""
+        suggest.get_index()
+        self.client.get(reverse('search'), {'q': 'лекарство от всего'})
+        self.client.get(
+            reverse('search'), {'q': 'лев толстой война и мир'})
+        self.assertEqual(self.texts('ле'), [])
+
+    @override_settings(SUGGEST_QUERY_MIN_COUNT=1, SUGGEST_MAX_QUERIES=4)
+    def test_evicted_queries_leave_index(self):
+        """Вытесненные из счетчика запросы уходят и из подсказок."""
+        suggest.get_index()
+        for query in ['война', 'война', 'мир', 'мир', 'мирный', 'миру',
+                      'мира']:
+            suggest.record_query(query)
+        self.assertEqual(self.texts('мир'), ['мир'])
+        self.assertEqual(self.texts('вой'), ['война'])
+        self.assertEqual(suggest.get_index().stats()['objects'], 5)
+
+    def test_best_beyond_alphabetical_range(self):
+        """Лучшая запись находится и за сотнями ключей префикса,
+        которые идут раньше нее по алфавиту."""
+        index = suggest.PrefixIndex()
+        for i in range(300):
+            index.add(suggest.USER, i, f'a{i:03}', f'a{i:03}', [f'a{i:03}'])
+        index.add(suggest.USER, 300, 'azimov', 'azimov', ['azimov'], 10)
+        index.add(suggest.USER, 301, 'abbot', 'abbot', ['abbot'], 5)
+        self.assertEqual(
+            [entry[2] for entry in index.lookup('a', 3)],
+            ['azimov', 'abbot', 'a000'])
+        self.assertEqual(index.lookup('az', 1)[0][2], 'azimov')
+        self.assertEqual(index.lookup('azim', 1)[0][2], 'azimov')
+        index.remove(suggest.USER, 300)
+        index.add(suggest.USER, 5, 'a005', 'a005', ['a005'], 7)
+        self.assertEqual(
+            [entry[2] for entry in index.lookup('a', 3)],
+            ['a005', 'abbot', 'a000'])
+        self.assertEqual(index.lookup('az', 1), [])
+
+    def test_long_prefix_from_top_list(self):
+        """Длинный префикс с большим диапазоном отвечает из списка
+        лучших, и load дает тот же ответ, что вставки по одной."""
+        records = [
+            (suggest.USER, i, f'writer{i:04}', f'writer{i:04}',
+             [f'writer{i:04}'], i % 37)
+            for i in range(500)
+        ]
+        loaded = suggest.PrefixIndex()
+        loaded.load(records)
+        added = suggest.PrefixIndex()
+        for record in records:
+            added.add(*record)
+        self.assertIn('writer0', loaded._top)
+        self.assertNotIn('writer00', loaded._top)
+        for prefix in ('w', 'writer', 'writer0', 'writer03', 'writer0499'):
+            self.assertEqual(
+                loaded.lookup(prefix, 5), added.lookup(prefix, 5), prefix)
+        best = [entry[1] for entry in loaded.lookup('writer0', 3)]
+        self.assertEqual(best, [36, 73, 110])
+        for index in (loaded, added):
+            index.remove(suggest.USER, 36)
+            index.add(suggest.USER, 1, 'writer0001', 'writer0001',
+                      ['writer0001'], 100)
+        for index in (loaded, added):
+            self.assertEqual(
+                [entry[1] for entry in index.lookup('writer0', 3)],
+                [1, 73, 110])
+
+    def test_stats_for_staff_only(self):
+        """Статистика памяти доступна только персоналу."""
+        url = reverse('search_suggest_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        User.objects.filter(pk=self.leo.pk).update(is_staff=True)
+        self.client.force_login(User.objects.get(pk=self.leo.pk))
+        self.assertIn('total_bytes', self.client.get(url).json())
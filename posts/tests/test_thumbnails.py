@@ -0,0 +1,174 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+GEOMETRY, OPTIONS = thumbnails.FALLBACK
+
+
+def image_file(name='photo.png', size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = override_settings(
+            MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+        cls.media.enable()
+        cls.user = User.objects.create_user(username='writer')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cls.media.disable()
+        super().tearDownClass()
+
+    def setUp(self):
+        # Картинки тестов одинаковы и хранятся под одним именем, поэтому
+        # миниатюры прошлых тестов убираются.
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_picture_never_resizes(self):
+        """Пока миниатюры нет, отдается исходная картинка, а файл
+        миниатюры при показе не создается."""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=image_file())
+        picture = thumbnails.picture(post.image)
+        self.assertEqual(
+            (picture['src'], picture['jpeg']), (post.image.url, ''))
+        target = thumbnails.backend.thumbnail_file(
+            post.image, GEOMETRY, **OPTIONS)
+        self.assertFalse(target.exists())
+
+        thumbnails.enqueue(post.image)
+        thumbnail = thumbnails.backend.cached(post.image, GEOMETRY, **OPTIONS)
+        self.assertEqual(thumbnail.name, target.name)
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+        self.assertEqual(thumbnails.picture(post.image)['src'], thumbnail.url)
+
+    def test_stale_missing_marker(self):
+        """Отметка «миниатюры нет» в кеше веб-процесса не прячет
+        миниатюру, которую записал процесс пула."""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=image_file())
+        thumbnails.enqueue(post.image)
+        target = thumbnails.backend.thumbnail_file(
+            post.image, GEOMETRY, **OPTIONS)
+        cache.set(add_prefix(target.key), EMPTY_VALUE)
+        self.assertEqual(
+            thumbnails.picture(post.image)['src'],
+            thumbnails.backend.cached(post.image, GEOMETRY, **OPTIONS).url)
+
+        cache.set(add_prefix(target.key), EMPTY_VALUE)
+        thumbnails._forget_missing(post.image.name)
+        self.assertIsNone(cache.get(add_prefix(target.key)))
+
+    def test_saves_enqueue_thumbnails(self):
+        """new_post и замена картинки в post_edit создают миниатюры,
+        лента показывает уже готовую."""
+        self.client.post(reverse('new_post'), {
+            'text': 'С картинкой', 'image': image_file()})
+        post = Post.objects.get(text='С картинкой')
+        thumbnail = thumbnails.backend.cached(post.image, GEOMETRY, **OPTIONS)
+        self.assertIsNotNone(thumbnail)
+        self.assertContains(self.client.get(reverse('index')), thumbnail.url)
+
+        self.client.post(
+            reverse('post_edit', args=[self.user.username, post.id]),
+            {'text': 'Новая', 'image': image_file('other.png')})
+        post.refresh_from_db()
+        self.assertIsNotNone(
+            thumbnails.backend.cached(post.image, GEOMETRY, **OPTIONS))
+
+    def test_enqueue_once(self):
+        """Картинка, уже стоящая в очереди, повторно не ставится."""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=image_file())
+        cache.set(thumbnails.QUEUED_KEY.format(post.image.name), 1)
+        thumbnails.enqueue(post.image)
+        self.assertIsNone(
+            thumbnails.backend.cached(post.image, GEOMETRY, **OPTIONS))
+
+    def test_picture_srcset(self):
+        """Лента отдает <picture> с шириной и высотой и srcset
+        всех ширин в WebP и JPEG."""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=image_file())
+        thumbnails.enqueue(post.image)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'width="960" height="339"')
+        picture = thumbnails.picture(post.image)
+        for width in thumbnails.WIDTHS:
+            self.assertRegex(picture['webp'], rf'\.webp {width}w')
+            self.assertRegex(picture['jpeg'], rf'\.jpg {width}w')
+        self.assertContains(
+            response, thumbnails.picture(post.image, 1200)['jpeg'])
+        thumbnail = thumbnails.backend.cached(
+            post.image, thumbnails.geometry(1920),
+            **thumbnails.options('WEBP'))
+        self.assertEqual((thumbnail.width, thumbnail.height), (1920, 678))
+
+    def test_backfill_command(self):
+        """Команда создает варианты для уже лежащих картинок."""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=image_file())
+        out = StringIO()
+        call_command('backfill_thumbnails', workers=0, stdout=out)
+        self.assertIn('обработано: 1, с ошибками: 0', out.getvalue())
+        for geometry, options in thumbnails.GEOMETRIES:
+            self.assertIsNotNone(
+                thumbnails.backend.cached(post.image, geometry, **options))
+
+    def test_page_prefetch(self):
+        """Миниатюры всей страницы читаются одним get_many и одним
+        запросом к таблице ключей, сколько бы картинок на ней ни было."""
+        def queries(count):
+            for i in range(count):
+                post = Post.objects.create(
+                    text='Текст', author=self.user,
+                    image=image_file(size=(1200, 800 + i)))
+                thumbnails.enqueue(post.image)
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('best_views'))
+            return len(context), response
+
+        one, _ = queries(1)
+        default = caches['default']
+        with mock.patch.object(
+                default, 'get_many', wraps=default.get_many) as get_many:
+            three, response = queries(2)
+        self.assertEqual(one, three)
+        self.assertEqual(get_many.call_count, 1)
+        for post in Post.objects.all():
+            thumbnail = thumbnails.backend.cached(
+                post.image, GEOMETRY, **OPTIONS)
+            self.assertContains(response, thumbnail.url)
@@ -0,0 +1,138 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(
+            text='Старый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def feed_ids(self, **params):
+        response = self.client.get(reverse('follow_index'), params)
+        return [post.id for post in response.context['page']]
+
+    def test_follow_backfills_and_new_post_fans_out(self):
+        """Подписка добавляет старые посты, новые раскладываются."""
+        self.client.get(
+            reverse('profile_follow', args=[self.author.username]))
+        self.assertEqual(self.feed_ids(), [self.old_post.id])
+
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self.feed_ids(), [new_post.id, self.old_post.id])
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка очищает ленту от постов автора."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(
+            reverse('profile_unfollow', args=[self.author.username]))
+        self.assertEqual(self.feed_ids(), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_rebuild_command(self):
+        """Команда rebuild_timelines восстанавливает ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed_ids(), [self.old_post.id])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2, TIMELINE_PULL_SIZE=30)
+    def test_popular_author_is_pulled_on_read(self):
+        """Посты популярного автора не раскладываются, а подмешиваются
+        в ленту при чтении вместе с обычными."""
+        regular = User.objects.create_user(username='regular')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=regular)
+        cache.clear()
+        for i in range(12):
+            Post.objects.create(text=f'Популярный {i}', author=self.author)
+            Post.objects.create(text=f'Обычный {i}', author=regular)
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.author).exclude(post=self.old_post).exists())
+
+        expected = list(Post.objects.filter(
+            author__in=[self.author, regular]).values_list('id', flat=True))
+        response = self.client.get(reverse('follow_index'))
+        page = response.context['page']
+        seen = [post.id for post in page]
+        while page.next_cursor:
+            page = self.client.get(
+                reverse('follow_index'),
+                {'cursor': page.next_cursor}).context['page']
+            seen.extend(post.id for post in page)
+        self.assertEqual(seen, expected)
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2)
+    def test_deleted_popular_post(self):
+        """Удаленный пост популярного автора пропадает из ленты."""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Популярный', author=self.author)
+        self.assertEqual(self.feed_ids(), [post.id, self.old_post.id])
+        post.delete()
+        self.assertEqual(self.feed_ids(), [self.old_post.id])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2)
+    def test_author_leaves_pull_mode(self):
+        """Когда подписчиков становится меньше порога, посты, написанные
+        в режиме подмешивания, раскладываются по лентам командой,
+        а не в запросе отписки."""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=fan, author=self.author)
+        post = Post.objects.create(text='Популярный', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed_ids(), [post.id, self.old_post.id])
+
+        out = StringIO()
+        call_command('catch_up_timelines', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(list(TimelineEntry.objects.filter(
+            author=self.author).order_by('post_id').values_list(
+                'user_id', 'post_id')),
+            [(self.reader.pk, self.old_post.pk), (self.reader.pk, post.pk)])
+        later = Post.objects.create(text='Снова обычный', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=later).exists())
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=3)
+    def test_follow_below_threshold_writes_once(self):
+        """Подписка, после которой подписчиков на одного меньше порога,
+        не раскладывает посты автора всем подписчикам заново."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            Follow.objects.create(
+                user=User.objects.create_user(username='second'),
+                author=self.author)
+        inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT')
+            and 'posts_timelineentry' in query['sql']]
+        self.assertEqual(len(inserts), 1)
@@ -0,0 +1,66 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import search, trigrams
+from posts.models import Group, Post, Trigram
+
+User = get_user_model()
+
+
+class TrigramTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.leo = User.objects.create_user(username='LeoTolstoy')
+        cls.fyodor = User.objects.create_user(username='fyodor')
+        cls.group = Group.objects.create(title='Русская проза', slug='prose')
+        cls.post = Post.objects.create(
+            text='Текст', author=cls.fyodor, group=cls.group)
+
+    def test_substring_lookup(self):
+        """Подстрока находится в любом месте строки без учета регистра."""
+        self.assertEqual(
+            trigrams.lookup(Trigram.USER, 'tols'), [self.leo.pk])
+        self.assertEqual(
+            trigrams.lookup(Trigram.GROUP, 'СКАЯ ПР'), [self.group.pk])
+        self.assertEqual(trigrams.lookup(Trigram.USER, 'eo'), [self.leo.pk])
+        self.assertEqual(trigrams.lookup(Trigram.USER, 'tolx'), [])
+
+    def test_candidates_are_verified(self):
+        """Совпадение всех триграмм без вхождения подстроки отсеивается."""
+        user = User.objects.create_user(username='abcxbcd')
+        self.assertIn(
+            user.pk, list(trigrams._candidates(Trigram.USER, 'abcd')))
+        self.assertEqual(trigrams.lookup(Trigram.USER, 'abcd'), [])
+
+    def test_index_follows_saves(self):
+        """Переименование и удаление обновляют индекс, вход — нет."""
+        leo = User.objects.get(pk=self.leo.pk)
+        leo.username = 'lev'
+        leo.save()
+        self.assertEqual(trigrams.lookup(Trigram.USER, 'tols'), [])
+        self.assertEqual(trigrams.lookup(Trigram.USER, 'lev'), [leo.pk])
+        with self.assertNumQueries(1):
+            leo.save(update_fields=['last_login'])
+        Group.objects.get(pk=self.group.pk).delete()
+        self.assertFalse(Trigram.objects.filter(
+            kind=Trigram.GROUP, object_id=self.group.pk).exists())
+
+    def test_fallback_search_uses_index(self):
+        """Запасной поиск находит посты по фрагменту имени автора."""
+        self.assertEqual(search._fallback(['yodo'], None), [self.post])
+        self.assertEqual(search._fallback(['ская'], None), [self.post])
+
+    def test_rebuild_command(self):
+        """Команда rebuild_trigrams восстанавливает индекс."""
+        Trigram.objects.all().delete()
+        call_command('rebuild_trigrams', chunk_size=2, stdout=StringIO())
+        self.assertEqual(
+            trigrams.lookup(Trigram.USER, 'tols'), [self.leo.pk])
+        self.assertEqual(
+            Trigram.objects.filter(
+                kind=Trigram.GROUP, object_id=self.group.pk).count(),
+            len(trigrams.grams(self.group.title)))
@@ -1,19 +1,26 @@
 import shutil
 import tempfile
+from importlib import import_module
 
+from django.apps import apps
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from posts.models import Comment, Follow, Group, Post
+from posts.paginator import encode_cursor
+from posts.tests.utils import QueryBudgetMixin
 from yatube.settings import PAR_PAGE
 
 User = get_user_model()
 
 
-class PostPagesTest(TestCase):
+class PostPagesTest(QueryBudgetMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -86,6 +93,109 @@ class PostPagesTest(TestCase):
         count_post_in_page = len(post.object_list)
         self.assertEqual(count_post_in_page, PAR_PAGE)
 
+    def test_cursor_paginator_walks_feed(self):
+        """Курсоры next/prev обходят ленту без пропусков и повторов,
+        ссылки ?page=N продолжают работать."""
+        Post.objects.bulk_create([Post(
+            text=i,
+            author=self.user)
+            for i in range(PAR_PAGE * 2)])
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True))
+
+        seen = []
+        cursors = []
+        url = reverse('index')
+        while url:
+            page = self.guest_client.get(url).context['page']
+            cursors.append(page.prev_cursor)
+            seen.extend(post.id for post in page)
+            url = (
+                f"{reverse('index')}?cursor={page.next_cursor}"
+                if page.next_cursor else None
+            )
+        self.assertEqual(seen, expected)
+        self.assertIsNone(cursors[0])
+
+        page = self.guest_client.get(
+            f"{reverse('index')}?cursor={cursors[-1]}").context['page']
+        self.assertEqual(
+            [post.id for post in page], expected[PAR_PAGE:PAR_PAGE * 2])
+
+        page = self.guest_client.get(
+            reverse('index'), {'page': 2}).context['page']
+        self.assertEqual(
+            [post.id for post in page], expected[PAR_PAGE:PAR_PAGE * 2])
+        self.assertIsNotNone(page.prev_cursor)
+
+        for cursor in ['broken', encode_cursor([{}, 1], 'n'),
+                       encode_cursor([None, None], 'n'),
+                       encode_cursor(['2021-01-01', 10 ** 30], 'p')]:
+            page = self.guest_client.get(
+                reverse('index'), {'cursor': cursor}).context['page']
+            self.assertEqual(
+                [post.id for post in page], expected[:PAR_PAGE])
+
+    def test_feed_pages_query_budget(self):
+        """Ленты не делают запросов на каждый пост."""
+        # Миниатюры картинок проверяются отдельно.
+        Post.objects.filter(pk=self.post.pk).update(image='')
+        author = User.objects.create_user(username='budget')
+        Follow.objects.create(user=self.user, author=author)
+        group = Group.objects.create(title='Бюджет', slug='budget')
+
+        def fill():
+            for i in range(PAR_PAGE):
+                post = Post.objects.create(
+                    text=f'Пост {i}', author=author, group=group)
+                Comment.objects.create(post=post, author=self.user, text='!')
+
+        urls = {
+            reverse('index'): 3,
+            reverse('page_group', args=[group.slug]): 4,
+            reverse('profile', args=[author.username]): 7,
+            reverse('follow_index'): 6,
+            reverse('best_views'): 4,
+            reverse('best_comment'): 4,
+        }
+        Post.objects.create(text='Первый', author=author, group=group)
+        for url, budget in urls.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(
+                    self.authorized_client, url, budget, fill)
+                Post.objects.filter(author=author).exclude(
+                    text='Первый').delete()
+
+    def test_best_views_after_seeding(self):
+        """Просмотры, накопленные до скетчей, засеивают unique_views,
+        и «самые просматриваемые» идут по ним, а не по id."""
+        seed = import_module(
+            'posts.migrations.0040_seed_unique_views').seed_unique_views
+        popular = Post.objects.create(text='Популярный', author=self.user)
+        newer = Post.objects.create(text='Новый', author=self.user)
+        Post.objects.update(unique_views=0)
+        Post.objects.filter(pk=popular.pk).update(views=50)
+        Post.objects.filter(pk=newer.pk).update(views=5)
+        Post.objects.filter(pk=self.post.pk).update(views=20)
+        seed(apps, None)
+        response = self.guest_client.get(reverse('best_views'))
+        self.assertEqual(
+            [post.id for post in response.context['page']],
+            [popular.id, self.post.id, newer.id])
+
+    def test_best_comment_orders_by_comment_count(self):
+        """Самые обсуждаемые посты идут по числу комментариев."""
+        quiet = Post.objects.create(text='Тихий', author=self.user)
+        loud = Post.objects.create(text='Громкий', author=self.user)
+        for post, count in ((self.post, 1), (loud, 2)):
+            for i in range(count):
+                Comment.objects.create(post=post, author=self.user, text=i)
+        response = self.guest_client.get(reverse('best_comment'))
+        ids = [post.id for post in response.context['page']]
+        self.assertEqual(ids, [loud.id, self.post.id])
+        self.assertNotIn(quiet.id, ids)
+
     def test_index_page_show_correct_context(self):
         """Шаблон index сформирован с правильным контекстом."""
         response = self.guest_client.get(reverse('index'))
@@ -101,6 +211,52 @@ class PostPagesTest(TestCase):
         self.assertEqual(
             self.group, response.context['total_group'][0])
 
+    def test_group_list_ordered_and_cached(self):
+        """Каталог групп идет по числу постов, стоит фиксированное число
+        запросов и обновляется после нового поста."""
+        def fill():
+            for i in range(PAR_PAGE):
+                Group.objects.create(title=f'Группа {i}', slug=f'group-{i}')
+
+        self.assertQueryBudget(
+            self.authorized_client, reverse('all_group'), 4, fill)
+        popular = Group.objects.get(slug='group-5')
+        for i in range(2):
+            Post.objects.create(text=i, author=self.user, group=popular)
+        response = self.guest_client.get(reverse('all_group'))
+        self.assertEqual(
+            [group.slug for group in response.context['total_group']][:2],
+            ['group-5', self.group.slug])
+        self.assertContains(response, 'Группа 5')
+        self.assertEqual(len(response.context['page']), PAR_PAGE)
+
+        Post.objects.create(text='Еще', author=self.user, group=self.group)
+        Post.objects.create(text='И еще', author=self.user, group=self.group)
+        response = self.guest_client.get(reverse('all_group'))
+        self.assertEqual(
+            response.context['total_group'][0].slug, self.group.slug)
+        self.assertLess(
+            response.content.decode().index(self.group.title),
+            response.content.decode().index('Группа 5'))
+
+    def test_group_list_cache_skips_queries(self):
+        """Повторный показ каталога групп берет разметку и навигацию
+        из кэша и не читает таблицу групп, а сортировка идет по индексу."""
+        for i in range(PAR_PAGE):
+            Group.objects.create(title=f'Группа {i}', slug=f'group-{i}')
+        cache.clear()
+        first = self.guest_client.get(reverse('all_group'))
+        with CaptureQueriesContext(connection) as queries:
+            again = self.guest_client.get(reverse('all_group'))
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'posts_group' in query['sql']])
+        self.assertEqual(again.content, first.content)
+        self.assertContains(again, '?cursor=')
+        plan = Group.objects.order_by('-post_count', 'id')[:10].explain()
+        self.assertIn('group_posts_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
     def test_group_page_show_correct_context(self):
         """Шаблон group сформирован с правильным контекстом.
         Проверка нового поста на странице выбранной группы."""
@@ -235,8 +391,8 @@ class PostPagesTest(TestCase):
 
         response_second_user = second_authorized_client.get(
             reverse('follow_index'))
-        count_post_second_user = response_second_user.context[
-            'page'].object_list.count()
+        count_post_second_user = len(response_second_user.context[
+            'page'].object_list)
         self.assertEqual(
             0,
             count_post_second_user,
@@ -0,0 +1,24 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка того, что страница ленты стоит фиксированное число
+    запросов независимо от количества постов на ней."""
+
+    def assertQueryBudget(self, client, url, budget, fill):
+        """Рендерит url до и после вызова fill() и сравнивает запросы."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as before:
+            client.get(url)
+        fill()
+        cache.clear()
+        with CaptureQueriesContext(connection) as after:
+            client.get(url)
+        self.assertLessEqual(
+            len(after), budget,
+            '\n'.join(query['sql'] for query in after.captured_queries))
+        self.assertEqual(
+            len(before), len(after),
+            'Число запросов зависит от количества постов на странице')
@@ -0,0 +1,296 @@
+"""Предварительная генерация миниатюр в пуле процессов.
+
+Сохранение поста с картинкой ставит в очередь миниатюры всех размеров
+из GEOMETRIES, работа идет в локальном ProcessPoolExecutor. Для каждой
+картинки строится лестница ширин WIDTHS в WebP и JPEG, шаблоны
+показывают ее через <picture> и srcset. Теги шаблонов только читают
+хранилище ключей sorl: пока миниатюры нет, отдается исходная картинка,
+а ресайз в запросе не выполняется никогда. Ленты передают в шаблон
+PagePrefetch, и миниатюры всей страницы читаются одним get_many.
+При THUMBNAIL_WORKERS = 0 генерация идет сразу в вызывающем процессе.
+"""
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Ширины вариантов картинки поста и пропорции карточки.
+WIDTHS = (320, 640, 960, 1920)
+ASPECT = (960, 339)
+# Форматы вариантов: WebP идет в <source>, JPEG — в сам <img>.
+WEBP = ('WEBP', 'image/webp')
+JPEG = ('JPEG', 'image/jpeg')
+FORMATS = (WEBP, JPEG)
+# Ширина <img> для браузеров без srcset и ее высота в разметке.
+FALLBACK_WIDTH = 960
+# Какую часть экрана занимает картинка карточки.
+SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+def geometry(width):
+    """Геометрия sorl для ширины с пропорциями карточки."""
+    return f'{width}x{round(width * ASPECT[1] / ASPECT[0])}'
+
+
+def options(image_format):
+    return {'crop': 'center', 'upscale': True, 'format': image_format}
+
+
+# Размеры и параметры всех миниатюр, которые используют шаблоны.
+GEOMETRIES = tuple(
+    (geometry(width), options(image_format))
+    for image_format, _ in FORMATS for width in WIDTHS
+)
+FALLBACK = (geometry(FALLBACK_WIDTH), options(JPEG[0]))
+QUEUED_KEY = 'thumbnails:queued:{}'
+# Столько картинка считается поставленной в очередь; если работа
+# упала, по истечении срока ее снова поставит первый показ.
+QUEUED_TIMEOUT = 10 * 60
+
+
+class ReadOnlyBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет только искать готовую миниатюру."""
+
+    def options(self, source, options):
+        """Параметры миниатюры так же, как их дополняет get_thumbnail:
+        от них зависит имя файла."""
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self.options(source, options))
+        return ImageFile(name, default.storage)
+
+    def cached(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None, файл картинки не читается."""
+        thumbnail = self.thumbnail_file(file_, geometry_string, **options)
+        return self.cached_many([thumbnail])[thumbnail.key]
+
+    def cached_many(self, thumbnails):
+        """Готовые миниатюры из списка ImageFile: словарь ключ -> файл.
+
+        Для хранилища ключей на кеше и базе это один get_many и один
+        запрос к таблице ключей на промахи. Отметке «нет в хранилище»,
+        которую sorl кладет в кеш на годы, чтение не верит и смотрит
+        в базу: миниатюру мог записать процесс пула со своим кешем.
+        """
+        kvstore = default.kvstore
+        if not isinstance(kvstore, CachedDBStore):
+            return {
+                thumbnail.key: kvstore.get(thumbnail)
+                for thumbnail in thumbnails
+            }
+        keys = {add_prefix(thumbnail.key): thumbnail.key
+                for thumbnail in thumbnails}
+        values = {
+            key: value
+            for key, value in kvstore.cache.get_many(list(keys)).items()
+            if value != EMPTY_VALUE
+        }
+        missing = [key for key in keys if key not in values]
+        if missing:
+            rows = dict(KVStore.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            kvstore.cache.set_many(
+                rows, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(rows)
+        found = dict.fromkeys(keys.values())
+        for key, value in values.items():
+            found[keys[key]] = deserialize_image_file(value)
+        return found
+
+
+backend = ReadOnlyBackend()
+_executor = None
+_lock = threading.Lock()
+
+
+def _init_worker():
+    # Соединения с базой, унаследованные от родителя, не разделяются.
+    connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                initializer=_init_worker)
+        return _executor
+
+
+def _source(name):
+    # Ключи sorl учитывают хранилище исходника: оно то же, что у поля.
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def render(name):
+    """Создает все миниатюры картинки name (выполняется в пуле)."""
+    source = _source(name)
+    for geometry_string, thumbnail_options in GEOMETRIES:
+        get_thumbnail(source, geometry_string, **thumbnail_options)
+
+
+def _render_logged(name):
+    try:
+        render(name)
+    except Exception:
+        logger.exception('Миниатюры %s не созданы', name)
+        return False
+    return True
+
+
+def backfill(names, workers):
+    """Создает недостающие миниатюры картинок names в workers процессах.
+
+    Готовые миниатюры sorl находит в хранилище ключей и не пересоздает,
+    так что повторный запуск дешев. Возвращает пару (создано, ошибок).
+    """
+    if not workers:
+        results = [_render_logged(name) for name in names]
+    else:
+        with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker) as executor:
+            results = list(executor.map(_render_logged, names, chunksize=4))
+    done = sum(results)
+    return done, len(results) - done
+
+
+def _done(name):
+    def callback(future):
+        if future.exception() is not None:
+            logger.error(
+                'Миниатюры %s не созданы', name, exc_info=future.exception())
+            return
+        cache.delete(QUEUED_KEY.format(name))
+        _forget_missing(name)
+    return callback
+
+
+def _forget_missing(name):
+    """Убирает из кеша этого процесса отметки «миниатюры нет»: пул
+    записал миниатюры через свой кеш."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBStore):
+        return
+    source = _source(name)
+    kvstore.cache.delete_many([
+        add_prefix(backend.thumbnail_file(source, geometry_string,
+                                          **thumbnail_options).key)
+        for geometry_string, thumbnail_options in GEOMETRIES
+    ])
+
+
+def enqueue(image):
+    """Ставит миниатюры картинки в очередь, если их еще не ждут."""
+    if not image:
+        return
+    name = image.name
+    if not cache.add(QUEUED_KEY.format(name), 1, QUEUED_TIMEOUT):
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        render(name)
+        cache.delete(QUEUED_KEY.format(name))
+        return
+    _get_executor().submit(render, name).add_done_callback(_done(name))
+
+
+class PagePrefetch:
+    """Миниатюры всех вариантов картинок постов страницы.
+
+    Хранилище ключей читается одним cached_many при первом обращении
+    тега picture; если фрагмент страницы взят из кеша, чтения нет.
+    Картинки не со страницы ищутся по одной.
+    """
+
+    def __init__(self, posts):
+        self.posts = posts
+        self._found = None
+
+    def _load(self):
+        return backend.cached_many([
+            backend.thumbnail_file(post.image, geometry_string, **options)
+            for post in self.posts if post.image
+            for geometry_string, options in GEOMETRIES
+        ])
+
+    def cached(self, image, geometry_string, **options):
+        if self._found is None:
+            self._found = self._load()
+        target = backend.thumbnail_file(image, geometry_string, **options)
+        if target.key not in self._found:
+            return backend.cached(image, geometry_string, **options)
+        return self._found[target.key]
+
+
+def prefetch(posts):
+    """PagePrefetch для постов страницы ленты (контекст «thumbnails»)."""
+    return PagePrefetch(posts)
+
+
+def picture(image, width=None, prefetched=None):
+    """Варианты картинки для <picture> из готовых миниатюр.
+
+    Словарь с srcset для WebP и JPEG, адресом запасного <img> и его
+    размерами. В srcset попадают только уже созданные ширины и, если
+    известна ширина исходника width, только не больше нее: растянутые
+    варианты качать незачем. Пока запасной миниатюры нет, src —
+    исходная картинка. Недостающие варианты уходят в пул. Миниатюры
+    ищутся в prefetched, если страница их собрала.
+    """
+    if not image:
+        return None
+    lookup = (prefetched or backend).cached
+    widths = [size for size in WIDTHS if not width or size <= width]
+    srcsets = {}
+    missing = False
+    for image_format, _ in FORMATS:
+        srcset = []
+        for size in widths or WIDTHS[:1]:
+            thumbnail = lookup(
+                image, geometry(size), **options(image_format))
+            if thumbnail is None:
+                missing = True
+            else:
+                srcset.append(f'{thumbnail.url} {size}w')
+        srcsets[image_format] = ', '.join(srcset)
+    if missing and settings.THUMBNAIL_WORKERS:
+        enqueue(image)
+    fallback = lookup(image, FALLBACK[0], **FALLBACK[1])
+    fallback_width, fallback_height = FALLBACK[0].split('x')
+    return {
+        'webp': srcsets[WEBP[0]],
+        'webp_type': WEBP[1],
+        'jpeg': srcsets[JPEG[0]],
+        'src': fallback.url if fallback is not None else image.url,
+        'sizes': SIZES,
+        'width': fallback_width,
+        'height': fallback_height,
+    }
@@ -0,0 +1,251 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import AuthorStat, Follow, Post, TimelineEntry
+from .paginator import CursorPaginator
+
+CELEBRITIES_KEY = 'timeline:celebrities'
+RECENT_KEY = 'timeline:recent:{}'
+
+
+def celebrity_ids():
+    """Авторы с числом подписчиков выше порога: их посты не
+    раскладываются по лентам, а подмешиваются при чтении. Сюда же
+    попадают авторы ниже порога, чьи посты за время подмешивания
+    еще не разложены командой catch_up_timelines."""
+    ids = cache.get(CELEBRITIES_KEY)
+    if ids is None:
+        ids = set(AuthorStat.objects.filter(
+            Q(followers_count__gte=settings.TIMELINE_FANOUT_THRESHOLD)
+            | Q(pull_since__isnull=False)
+        ).values_list('user_id', flat=True))
+        cache.set(CELEBRITIES_KEY, ids, settings.TIMELINE_CACHE_TIMEOUT)
+    return ids
+
+
+def recent_posts(author_id):
+    """Кэшированный список (pub_date, id) последних постов автора."""
+    key = RECENT_KEY.format(author_id)
+    posts = cache.get(key)
+    if posts is None:
+        posts = list(Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id').values_list(
+                'pub_date', 'id')[:settings.TIMELINE_PULL_SIZE])
+        cache.set(key, posts, settings.TIMELINE_CACHE_TIMEOUT)
+    return posts
+
+
+def forget_recent_posts(author_id):
+    cache.delete(RECENT_KEY.format(author_id))
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора пачками."""
+    forget_recent_posts(post.author_id)
+    if post.author_id in celebrity_ids():
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    batch = []
+    for user_id in follower_ids.iterator():
+        batch.append(TimelineEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        ))
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            _bulk_insert(batch)
+            batch = []
+    if batch:
+        _bulk_insert(batch)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя посты нового автора. Автор,
+    который только ждет catch_up(), раскладывается целиком: его
+    старых постов у нового подписчика иначе не будет."""
+    if AuthorStat.objects.filter(
+            user_id=author_id,
+            followers_count__gte=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).exists():
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date')
+    _bulk_insert([
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    ])
+
+
+def follower_added(author_id):
+    """Переводит автора в режим подмешивания, когда число его
+    подписчиков дорастает до TIMELINE_FANOUT_THRESHOLD, и запоминает
+    момент перехода.
+
+    Обратный переход в запросе не делается: автор остается
+    в подмешивании, пока catch_up() не разложит его посты с этого
+    момента по лентам подписчиков.
+    """
+    updated = AuthorStat.objects.filter(
+        user_id=author_id, pull_since__isnull=True,
+        followers_count__gte=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).update(pull_since=datetime.now())
+    if updated:
+        cache.delete(CELEBRITIES_KEY)
+
+
+def catch_up():
+    """Возвращает к раскладке авторов, у которых подписчиков стало
+    меньше порога: их посты, опубликованные с начала подмешивания,
+    добавляются всем подписчикам. Возвращает число авторов."""
+    stats = AuthorStat.objects.filter(
+        pull_since__isnull=False,
+        followers_count__lt=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).values_list('user_id', 'pull_since')
+    total = 0
+    for author_id, since in list(stats):
+        # Сначала автор выходит из подмешивания, потом раскладываются
+        # посты: пост, опубликованный между шагами, попадет в выборку.
+        if not AuthorStat.objects.filter(
+                user_id=author_id, pull_since=since).update(pull_since=None):
+            continue
+        cache.delete(CELEBRITIES_KEY)
+        posts = list(Post.objects.filter(
+            author_id=author_id, pub_date__gte=since).values_list(
+                'id', 'pub_date'))
+        user_ids = Follow.objects.filter(author_id=author_id).values_list(
+            'user_id', flat=True)
+        batch = []
+        for user_id in user_ids.iterator():
+            batch.extend(
+                TimelineEntry(user_id=user_id, post_id=post_id,
+                              author_id=author_id, pub_date=pub_date)
+                for post_id, pub_date in posts)
+            if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+                _bulk_insert(batch)
+                batch = []
+        _bulk_insert(batch)
+        total += 1
+    return total
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild():
+    """Пересобирает все ленты с нуля по таблице подписок."""
+    TimelineEntry.objects.all().delete()
+    # Ленты авторов ниже порога собираются целиком, догонять их незачем.
+    AuthorStat.objects.filter(
+        followers_count__lt=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).update(pull_since=None)
+    cache.delete(CELEBRITIES_KEY)
+    celebrities = celebrity_ids()
+    followers = {}
+    for user_id, author_id in Follow.objects.values_list(
+            'user_id', 'author_id').iterator():
+        followers.setdefault(author_id, []).append(user_id)
+    total = 0
+    for author_id, user_ids in followers.items():
+        if author_id in celebrities:
+            continue
+        posts = list(Post.objects.filter(author_id=author_id).values_list(
+            'id', 'pub_date'))
+        batch = []
+        for user_id in user_ids:
+            for post_id, pub_date in posts:
+                batch.append(TimelineEntry(
+                    user_id=user_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                ))
+            if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+                _bulk_insert(batch)
+                total += len(batch)
+                batch = []
+        _bulk_insert(batch)
+        total += len(batch)
+    return total
+
+
+def timeline(user):
+    """Лента подписок пользователя в порядке (pub_date, post)."""
+    return TimelineEntry.objects.filter(user=user).only(
+        'pub_date', 'post_id')
+
+
+class TimelinePaginator(CursorPaginator):
+    """Пагинатор ленты подписок, смешивающий push и pull.
+
+    Посты обычных авторов читаются из TimelineEntry, посты популярных
+    авторов берутся из их кэшированных списков последних постов
+    и вливаются в окно страницы по тому же ключу (pub_date, post_id).
+    Глубже TIMELINE_PULL_SIZE постов популярного автора лента не идет.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(timeline(user), per_page, ('-pub_date', '-post_id'))
+        self.user = user
+
+    def _pulled(self, values, forward):
+        followed = set(Follow.objects.filter(user=self.user).values_list(
+            'author_id', flat=True))
+        keys = []
+        for author_id in followed & celebrity_ids():
+            for pub_date, post_id in recent_posts(author_id):
+                key = (pub_date, post_id)
+                if values is not None:
+                    cursor = tuple(values)
+                    if key == cursor or (key < cursor) != forward:
+                        continue
+                keys.append((key, author_id))
+        return keys
+
+    def _fetch(self, values, forward, offset=0):
+        limit = offset + self.per_page + 1
+        rows = {
+            entry.post_id: entry
+            for entry in self._queryset(values, forward)[:limit]
+        }
+        pulled = {}
+        for (pub_date, post_id), author_id in self._pulled(values, forward):
+            if post_id not in rows:
+                pulled[post_id] = TimelineEntry(
+                    user=self.user,
+                    post_id=post_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+        rows.update(pulled)
+        window = sorted(
+            rows.values(),
+            key=lambda entry: (entry.pub_date, entry.post_id),
+            reverse=forward,
+        )[offset:limit]
+        posts = Post.objects.feed().in_bulk(
+            [entry.post_id for entry in window])
+        # Пост мог быть удален, пока его id лежал в кэше автора.
+        window = [entry for entry in window if entry.post_id in posts]
+        for entry in window:
+            entry.post = posts[entry.post_id]
+        return window
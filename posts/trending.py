@@ -0,0 +1,86 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Post, PostViewBucket, TrendingPost
+from .paginator import CursorPaginator
+from .sketches import hour_start
+
+TIMER_KEY = 'trending:timer'
+
+
+def add_to_buckets(counts, moment=None):
+    """Добавляет сброшенные просмотры {post_id: n} в часовые корзины."""
+    hour = hour_start(moment)
+    existing = set(PostViewBucket.objects.filter(
+        post_id__in=list(counts), hour=hour).values_list(
+            'post_id', flat=True))
+    by_delta = defaultdict(list)
+    for post_id in existing:
+        by_delta[counts[post_id]].append(post_id)
+    with transaction.atomic():
+        for count, post_ids in by_delta.items():
+            PostViewBucket.objects.filter(
+                post_id__in=post_ids, hour=hour).update(
+                    views=F('views') + count)
+        PostViewBucket.objects.bulk_create([
+            PostViewBucket(post_id=post_id, hour=hour, views=count)
+            for post_id, count in counts.items()
+            if post_id not in existing
+        ])
+
+
+def recompute(now=None):
+    """Пересчитывает таблицу рейтинга по корзинам за окно.
+
+    Вклад часа убывает вдвое каждые TRENDING_HALF_LIFE_HOURS,
+    в таблице остаются первые TRENDING_SIZE постов. Корзины старше
+    окна больше не нужны и удаляются.
+    """
+    now = now or datetime.now()
+    since = hour_start(now) - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+    PostViewBucket.objects.filter(hour__lt=since).delete()
+    decay = math.log(2) / settings.TRENDING_HALF_LIFE_HOURS
+    scores = defaultdict(float)
+    buckets = PostViewBucket.objects.filter(hour__gte=since).values_list(
+        'post_id', 'hour', 'views')
+    for post_id, hour, views in buckets.iterator():
+        age = max((now - hour).total_seconds() / 3600, 0)
+        scores[post_id] += views * math.exp(-decay * age)
+    top = sorted(
+        scores.items(), key=lambda item: (-item[1], -item[0])
+    )[:settings.TRENDING_SIZE]
+    with transaction.atomic():
+        TrendingPost.objects.all().delete()
+        TrendingPost.objects.bulk_create([
+            TrendingPost(rank=rank, post_id=post_id, score=score)
+            for rank, (post_id, score) in enumerate(top, start=1)
+        ])
+    return len(top)
+
+
+def recompute_if_due():
+    """Пересчет не чаще раза в TRENDING_INTERVAL секунд."""
+    if cache.add(TIMER_KEY, 1, settings.TRENDING_INTERVAL):
+        recompute()
+
+
+class TrendingPaginator(CursorPaginator):
+    """Страницы рейтинга по первичному ключу rank; посты страницы
+    подгружаются одним запросом через Post.objects.feed()."""
+
+    def __init__(self, per_page):
+        super().__init__(
+            TrendingPost.objects.only('rank', 'post_id'), per_page, ('rank',))
+
+    def _fetch(self, values, forward, offset=0):
+        rows = super()._fetch(values, forward, offset)
+        posts = Post.objects.feed().in_bulk([row.post_id for row in rows])
+        for row in rows:
+            row.post = posts[row.post_id]
+        return rows
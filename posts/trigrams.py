@@ -0,0 +1,84 @@
+"""Инвертированный индекс триграмм по именам пользователей и названиям
+групп.
+
+Каждая триграмма строки — строка таблицы Trigram, список объектов
+одной триграммы читается по уникальному индексу (kind, gram, object_id).
+Поиск подстроки — пересечение списков всех триграмм фрагмента одним
+GROUP BY ... HAVING, после чего кандидаты проверяются на настоящее
+вхождение (совпадение всех триграмм его не гарантирует).
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Group, Trigram
+
+User = get_user_model()
+
+SOURCES = {
+    Trigram.USER: (User, 'username'),
+    Trigram.GROUP: (Group, 'title'),
+}
+
+
+def grams(text):
+    """Множество триграмм строки без учета регистра."""
+    text = (text or '').lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def index(kind, object_id, text):
+    """Заменяет триграммы объекта в индексе."""
+    with transaction.atomic():
+        Trigram.objects.filter(kind=kind, object_id=object_id).delete()
+        Trigram.objects.bulk_create([
+            Trigram(kind=kind, gram=gram, object_id=object_id)
+            for gram in grams(text)
+        ])
+
+
+def remove(kind, object_id):
+    Trigram.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def _candidates(kind, fragment):
+    wanted = grams(fragment)
+    postings = Trigram.objects.filter(kind=kind)
+    if not wanted:
+        # Фрагмент короче триграммы: ищем его внутри самих триграмм,
+        # это перебор словаря триграмм, а не исходных строк.
+        return postings.filter(gram__contains=fragment).values_list(
+            'object_id', flat=True).distinct()
+    return postings.filter(gram__in=wanted).values('object_id').annotate(
+        found=Count('gram')).filter(found=len(wanted)).values_list(
+            'object_id', flat=True)
+
+
+def lookup(kind, fragment):
+    """id объектов kind, в строке которых есть подстрока fragment."""
+    fragment = (fragment or '').lower()
+    if not fragment:
+        return []
+    model, field = SOURCES[kind]
+    rows = model.objects.filter(
+        pk__in=list(_candidates(kind, fragment))).values_list('pk', field)
+    return [pk for pk, text in rows if fragment in text.lower()]
+
+
+def rebuild(chunk_size=1000):
+    """Пересобирает индекс целиком, кусками по chunk_size строк."""
+    total = 0
+    with transaction.atomic():
+        Trigram.objects.all().delete()
+        for kind, (model, field) in SOURCES.items():
+            rows = model.objects.order_by('pk').values_list('pk', field)
+            batch = []
+            for pk, text in rows.iterator(chunk_size=chunk_size):
+                batch.extend(
+                    Trigram(kind=kind, gram=gram, object_id=pk)
+                    for gram in grams(text))
+                if len(batch) >= chunk_size:
+                    total += len(Trigram.objects.bulk_create(batch))
+                    batch = []
+            total += len(Trigram.objects.bulk_create(batch))
+    return total
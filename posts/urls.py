@@ -6,11 +6,18 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('search/', views.search, name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
+    path(
+        'search/suggest/stats/',
+        views.search_suggest_stats,
+        name='search_suggest_stats'
+    ),
     path(
         'best_views/',
         views.best_views,
         name='best_views'
     ),
+    path('trending/', views.best_trending, name='best_trending'),
     path(
         'best_comment/',
         views.best_comment,
@@ -25,6 +32,8 @@ urlpatterns = [
     path('stat_group/', views.stat_group, name='stat_group'),
     path('stat_author/', views.stat_author, name='stat_author'),
     path('stat_follow/', views.stat_follow, name='stat_follow'),
+    path('stat_data/<str:kind>/', views.stat_data, name='stat_data'),
+    path('stat_chart/<str:kind>/', views.stat_chart, name='stat_chart'),
     path('group/', views.group_list, name='all_group'),
     path('group/<slug:slug>/', views.group_posts, name='page_group'),
     path('new_group/', views.new_group, name='new_group'),
@@ -1,22 +1,34 @@
+from urllib.parse import urlencode
+
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.db.models import Q, Count, Sum
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from yatube.settings import PAR_PAGE
 
-from .forms import CommentForm, PostForm, GroupForm
-from .models import Follow, Group, Post, User, Comment
+from . import (charts, leaderboard, pageviews, stats, suggest,
+               thumbnails)
+from .counters import GROUPS_VERSION_KEY, version
+from .forms import CommentForm, GroupForm, PostForm, StatRangeForm
+from .models import Follow, Group, Post, User
+from .paginator import paginate
+from .search import SearchPaginator
+from .timeline import TimelinePaginator
+from .trending import TrendingPaginator
 
 
 def index(request):
     """Главная страница."""
-    post_list = Post.objects.select_related('group').all()
-    paginator = Paginator(post_list, PAR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, Post.objects.feed())
     return render(
         request, 'index.html', {
             'page': page,
+            'thumbnails': thumbnails.prefetch(page),
             'index': True,
             'all_author': True,
         }
@@ -26,13 +38,13 @@ def index(request):
 @login_required
 def follow_index(request):
     """Страница избранных авторов."""
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, PAR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, paginator=TimelinePaginator(
+        request.user, PAR_PAGE))
+    page.object_list = [entry.post for entry in page.object_list]
     return render(request, "follow.html", {
         'page': page,
-        'paginator': paginator,
+        'thumbnails': thumbnails.prefetch(page),
+        'paginator': page.paginator,
         'index': True,
     }
     )
@@ -99,74 +111,74 @@ def group_edit(request, slug):
 def group_posts(request, slug):
     """Страница группы."""
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, PAR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, group.posts.feed())
     return render(
         request, 'group.html', {
             'group': group,
             'page': page,
+            'thumbnails': thumbnails.prefetch(page),
         }
     )
 
 
 def group_list(request):
-    """Страница всех групп."""
-
-    count_group = Post.objects.values(
-        'group').order_by('-count').annotate(count=Count('group'))
-    total_group = []
-    for group in count_group:
-        if group['group'] is None:
-            continue
-        total_group.append(
-            Group.objects.get(id=group['group']))
-    # Список id групп без нулевых постов
-    total_group_id = []
-    for group in total_group:
-        total_group_id.append(group.id)
-    check = Group.objects.values('id')
-    check_list = []
-    for group in check:
-        check_list.append(group['id'])
-    result = list(set(check_list) - set(total_group_id))
-    for group in result:
-        total_group.append(Group.objects.get(id=group))
-    # Все посты по алфавиту title.
-    # total_group = Group.objects.order_by('title').all()
-    return render(request, 'group_list.html', {'total_group': total_group})
+    """Страница всех групп по убыванию числа постов.
+
+    Группы читаются одним запросом по индексу (-post_count, id),
+    разметка вместе с навигацией кэшируется до изменения постов или
+    групп. Страница ленивая: при попадании в кэш запроса нет.
+    """
+    page = SimpleLazyObject(lambda: paginate(
+        request, Group.objects.all(), ordering=('-post_count', 'id')))
+    return render(request, 'group_list.html', {
+        'total_group': page,
+        'page': page,
+        'page_key': request.GET.urlencode(),
+        'groups_version': version(GROUPS_VERSION_KEY),
+        'all_group': True,
+    }
+    )
 
 
 def best_views(request):
     """Страница самых просматриваемых постов."""
-    post_list = Post.objects.select_related('group').order_by('-views').all()
-    paginator = Paginator(post_list, PAR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(
+        request, Post.objects.feed(), ordering=('-unique_views', '-id'))
     return render(
         request, 'best.html', {
             'page': page,
+            'thumbnails': thumbnails.prefetch(page),
             'best': True,
             'best_views': True,
         }
     )
 
 
+def best_trending(request):
+    """Страница постов в тренде."""
+    page = paginate(request, paginator=TrendingPaginator(PAR_PAGE))
+    page.object_list = [row.post for row in page.object_list]
+    return render(
+        request, 'best.html', {
+            'page': page,
+            'thumbnails': thumbnails.prefetch(page),
+            'best': True,
+            'best_trending': True,
+        }
+    )
+
+
 def best_comment(request):
     """Страница самых комментируемых постов."""
-    count_comment = Comment.objects.values(
-        'post').order_by('-count').annotate(count=Count('post'))
-    post_list = []
-    for comment in count_comment:
-        post_list.append(
-            Post.objects.select_related('group').get(id=comment['post']))
-    paginator = Paginator(post_list, PAR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(
+        request,
+        Post.objects.feed().filter(comment_count__gt=0),
+        ordering=('-comment_count', '-id'),
+    )
     return render(
         request, 'best.html', {
             'page': page,
+            'thumbnails': thumbnails.prefetch(page),
             'best': True,
             'best_comment': True,
         }
@@ -175,103 +187,125 @@ def best_comment(request):
 
 def best_author(request):
     """Страница самого популярного автора."""
-    count_author = Follow.objects.values(
-        'author').order_by('-count').annotate(count=Count('author'))
-    post_list = Post.objects.select_related(
-        'group').filter(author=count_author[0]['author'])
-    paginator = Paginator(post_list, PAR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    leader = leaderboard.top_authors(1).first()
+    if leader is None:
+        post_list = Post.objects.none()
+    else:
+        post_list = Post.objects.feed().filter(author_id=leader.user_id)
+    page = paginate(request, post_list)
     return render(
         request, 'best.html', {
             'page': page,
+            'thumbnails': thumbnails.prefetch(page),
             'best': True,
             'best_author': True,
         }
     )
 
 
-def stat_author(request):
-    """Страница статистики авторов."""
-    labels = []
-    data = []
-    qs = Post.objects.values('author').order_by(
-        '-count').annotate(count=Count('author'))[:5]
-    for post in qs:
-        labels.append(User.objects.get(id=post['author']).username)
-        data.append(post['count'])
+def _chart_url(request, kind):
+    """Адрес SVG-графика с текущей версией счетчиков в параметре v."""
+    params = {
+        name: request.GET[name] for name in ('date_from', 'date_to')
+        if request.GET.get(name)
+    }
+    params['v'] = _stat_etag(request, kind)
+    return f'{reverse("stat_chart", args=[kind])}?{urlencode(params)}'
+
+
+def _stat_page(request, kind):
+    """Оболочка страницы статистики: график отрисован на сервере
+    в stat_chart, данные в JSON отдает stat_data."""
     return render(request, 'statistic.html', {
-        'labels': labels,
-        'data': data,
+        'form': StatRangeForm(request.GET or None),
+        'chart': stats.STATS[kind],
+        'chart_url': _chart_url(request, kind),
+        'kind': kind,
         'stat': True,
-        'stat_author_nav': True,
+        stats.STATS[kind].nav: True,
     }
     )
 
 
+def stat_author(request):
+    """Страница статистики авторов."""
+    return _stat_page(request, 'author')
+
+
 def stat_view(request):
     """Страница статистики просмотра постов."""
-    labels = []
-    data = []
-    qs = Post.objects.values(
-        'author').order_by('-sum').annotate(sum=Sum('views'))[:5]
-    for post in qs:
-        labels.append(User.objects.get(id=post['author']).username)
-        data.append(post['sum'])
-    return render(request, 'statistic.html', {
-        'labels': labels,
-        'data': data,
-        'stat': True,
-        'stat_view_nav': True,
-    }
-    )
+    return _stat_page(request, 'view')
 
 
 def stat_group(request):
     """Страница статистики групп."""
-    labels = []
-    data = []
-    qs = Post.objects.values('group').order_by(
-        '-count').annotate(count=Count('group'))[:5]
-    for post in qs:
-        if post['count'] == 0:
-            continue
-        labels.append(Group.objects.get(id=post['group']).title)
-        data.append(post['count'])
-    return render(request, 'statistic.html', {
-        'labels': labels,
-        'data': data,
-        'stat': True,
-        'stat_group_nav': True,
-    }
-    )
+    return _stat_page(request, 'group')
 
 
 def stat_follow(request):
     """Страница статистики подписчиков."""
-    labels = []
-    data = []
-    qs = Follow.objects.values('author').order_by(
-        '-count').annotate(count=Count('author'))[:5]
-    for post in qs:
-        labels.append(User.objects.get(id=post['author']).username)
-        data.append(post['count'])
-    return render(request, 'statistic.html', {
-        'labels': labels,
-        'data': data,
-        'stat': True,
-        'stat_follow_nav': True,
-    }
+    return _stat_page(request, 'follow')
+
+
+def _stat_etag(request, kind):
+    if kind not in stats.STATS:
+        return None
+    return stats.etag(
+        kind, request.GET.get('date_from', ''),
+        request.GET.get('date_to', ''))
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=_stat_etag)
+def stat_data(request, kind):
+    """Данные графика статистики в JSON.
+
+    Без диапазона дат отдаются общие счетчики, с диапазоном — суммы
+    дневных сводок. На If-None-Match с текущим ETag отвечает 304
+    без запросов к базе.
+    """
+    if kind not in stats.STATS:
+        raise Http404
+    form = StatRangeForm(request.GET or None)
+    dates = form.cleaned_data if form.is_valid() else {}
+    return JsonResponse(
+        stats.dataset(kind, dates.get('date_from'), dates.get('date_to')),
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')},
+    )
+
+
+def stat_chart(request, kind):
+    """SVG-график статистики.
+
+    Адрес содержит версию счетчиков, поэтому ответ кэшируется надолго.
+    На адрес с другой версией отдается текущий график, но ненадолго:
+    перенаправление могло бы гонять браузер между процессами, которые
+    еще не увидели новую версию.
+    """
+    if kind not in stats.STATS:
+        raise Http404
+    version = _stat_etag(request, kind)
+    form = StatRangeForm(request.GET or None)
+    dates = form.cleaned_data if form.is_valid() else {}
+    response = HttpResponse(
+        charts.chart_svg(
+            kind, version, dates.get('date_from'), dates.get('date_to')),
+        content_type='image/svg+xml; charset=utf-8',
     )
+    if request.GET.get('v') == version:
+        patch_cache_control(
+            response, public=True, max_age=charts.MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=charts.STALE_MAX_AGE)
+    return response
 
 
 def profile(request, username):
     """Страница профиля пользователя."""
     author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    paginator = Paginator(posts, PAR_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = author.posts.feed()
+    page = paginate(request, posts)
     # Авторизованный пользователь(подписчик) подписан на автора страницы.
     if request.user.is_authenticated:
         following: bool = Follow.objects.filter(
@@ -283,11 +317,24 @@ def profile(request, username):
         'author': author,
         'posts': posts,
         'page': page,
+        'thumbnails': thumbnails.prefetch(page),
         'following': following,
     }
     )
 
 
+def _visitor(request):
+    """Идентификатор читателя для подсчета уникальных просмотров."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    if request.session.session_key:
+        return f'session:{request.session.session_key}'
+    # Сессию ради счетчика не создаем: это запись в базу на каждый хит.
+    meta = request.META
+    return 'anon:{}:{}'.format(
+        meta.get('REMOTE_ADDR', ''), meta.get('HTTP_USER_AGENT', ''))
+
+
 def post_view(request, username, post_id):
     """Страница записи."""
     post = get_object_or_404(Post, pk=post_id, author__username=username)
@@ -299,8 +346,8 @@ def post_view(request, username, post_id):
     else:
         following: bool = False
     if not request.user == post.author:
-        post.views += 1
-        post.save(update_fields=['views'])
+        pageviews.record_view(post, _visitor(request))
+    post.views += pageviews.pending(post.pk)
     return render(request, 'post.html', {
         'author': post.author,
         'post': post,
@@ -323,6 +370,7 @@ def new_post(request):
     post.author = request.user
     post.views += 1
     post.save()
+    thumbnails.enqueue(post.image)
     return redirect('index')
 
 
@@ -337,7 +385,9 @@ def post_edit(request, username, post_id):
             initial={'text': post.text, 'group': post.group}
         )
         if form.is_valid():
-            form.save()
+            post = form.save()
+            if 'image' in form.changed_data:
+                thumbnails.enqueue(post.image)
             return redirect(post_view, username, post_id)
         return render(request, 'new.html', {
             'post': post,
@@ -404,19 +454,32 @@ def server_error(request):
 
 def search(request):
     """Страница поиска по постам."""
-    query = request.GET.get('q')
-    page = Post.objects.select_related('group').filter(
-        Q(text__contains=query.lower())
-        | Q(author__username__contains=query.lower())
-        | Q(group__title__contains=query.lower())
-        | Q(pub_date__contains=query.lower())
-    )
-    # paginator = Paginator(object_list, PAR_PAGE)
-    # page_number = request.GET.get('page')
-    # search_url = '?q=%s' % query
-    # page = paginator.get_page(page_number)
+    query = request.GET.get('q', '')
+    page = paginate(request, paginator=SearchPaginator(query, PAR_PAGE))
+    page.object_list = [hit.post for hit in page.object_list]
+    first = not request.GET.get('cursor') and not request.GET.get('page')
+    if first and page.object_list:
+        # Подсказкой может стать только запрос, который что-то нашел.
+        suggest.record_query(query)
     return render(request, 'search.html', {
         'page': page,
+        'thumbnails': thumbnails.prefetch(page),
         'query': query,
     }
     )
+
+
+@cache_control(public=True, max_age=60)
+def search_suggest(request):
+    """Подсказки для строки поиска в JSON, без запросов к базе."""
+    query = request.GET.get('q', '')
+    return JsonResponse(
+        {'query': query, 'suggestions': suggest.suggest(query)},
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+@staff_member_required
+def search_suggest_stats(request):
+    """Размер индекса подсказок и занятая им память."""
+    return JsonResponse(suggest.get_index().stats())
@@ -147,6 +147,10 @@ LOGIN_REDIRECT_URL = 'index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# LocMemCache у каждого процесса свой: буфер просмотров, версии
+# и блокировки не видны другим воркерам и команде flush_views.
+# В продакшене нужен общий кэш с атомарным incr (memcached, redis),
+# иначе накопленные воркером просмотры пропадают с его перезапуском.
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -154,3 +158,42 @@ CACHES = {
 }
 
 PAR_PAGE = 10
+
+# Размер пачки при раскладке постов по лентам подписчиков.
+TIMELINE_BATCH_SIZE = 500
+# Авторы с таким числом подписчиков не раскладываются по лентам,
+# их последние TIMELINE_PULL_SIZE постов подмешиваются при чтении.
+# Авторов, у которых подписчиков снова стало меньше, возвращает
+# к раскладке команда catch_up_timelines (по расписанию).
+TIMELINE_FANOUT_THRESHOLD = 1000
+TIMELINE_PULL_SIZE = 100
+TIMELINE_CACHE_TIMEOUT = 300
+
+# Просмотры копятся в кэше и сбрасываются в базу раз в
+# VIEWS_FLUSH_INTERVAL секунд или после VIEWS_FLUSH_THRESHOLD просмотров.
+VIEWS_FLUSH_INTERVAL = 60
+VIEWS_FLUSH_THRESHOLD = 1000
+VIEWS_FLUSH_BATCH_SIZE = 500
+
+# Рейтинг «в тренде»: просмотры за окно с экспоненциальным затуханием.
+# Пересчитывается командой flush_views не чаще раза в TRENDING_INTERVAL
+# секунд или командой recompute_trending.
+TRENDING_WINDOW_HOURS = 72
+TRENDING_HALF_LIFE_HOURS = 12
+TRENDING_SIZE = 500
+TRENDING_INTERVAL = 300
+
+# Поиск: не больше SEARCH_LIMIT результатов на запрос, ранжированный
+# список id запроса живет в кэше SEARCH_CACHE_TIMEOUT секунд.
+SEARCH_LIMIT = 200
+SEARCH_CACHE_TIMEOUT = 60
+
+# Подсказки поиска: сколько отдавать и после скольких повторов запрос
+# сам становится подсказкой; счетчики запросов держатся в памяти.
+SUGGEST_LIMIT = 8
+SUGGEST_QUERY_MIN_COUNT = 3
+SUGGEST_MAX_QUERIES = 1000
+
+# Миниатюры создаются в пуле из стольких процессов; 0 — сразу
+# в процессе, сохранившем пост (без пула).
+THUMBNAIL_WORKERS = 2